@@ -1,5 +1,16 @@
-from .simple_data_class import DataClassBase
-from .import_user_config import UserConfigAutoImporter
+from .simple_data_class import DataClassBase, FrozenConfigBase, ConfigNotMergedError, cached_by_config_version
+from .import_user_config import UserConfigAutoImporter, batch_auto_import_user_config
+import sys as _sys
+
+if _sys.version_info < (3, 7):  # 3.6 不支持模块级 __getattr__
+    from .nb_config_decorator import nb_config_class
+else:
+    def __getattr__(name):
+        # nb_config_class 第一次被访问时才导入装饰器模块，加快 import nb_config
+        if name == 'nb_config_class':
+            from .nb_config_decorator import nb_config_class
+            return nb_config_class
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 __version__ = '1.3'
 
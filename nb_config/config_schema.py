@@ -0,0 +1,274 @@
+"""
+配置类的类型校验和转换。
+每个配置类只编译一次 {配置名: 转换函数}，有类注解的配置项按注解严格校验和转换；
+没有注解时根据三方包默认值的类型推断，只把字符串转换成数字或 bool ，例如用户写了 port = '5432' 会被转换成 5432 ，
+其他类型的值原样保留(例如默认值是字符串、用户写的是 Path 或 logging.INFO)。
+转换不了的直接报错并指出用户配置文件的行号，三方包在热点代码中使用配置时不需要再做防御性的类型转换。
+"""
+import json
+import typing
+
+from nb_config.simple_data_class import DataClassBase
+
+_TRUE_STRS = ('1', 'true', 'yes', 'on')
+_FALSE_STRS = ('0', 'false', 'no', 'off')
+
+
+class _CoerceError(Exception):
+    pass
+
+
+def _to_bool(v):
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, int) and v in (0, 1):
+        return bool(v)
+    if isinstance(v, str):
+        lower = v.strip().lower()
+        if lower in _TRUE_STRS:
+            return True
+        if lower in _FALSE_STRS:
+            return False
+    raise _CoerceError
+
+
+def _to_int(v):
+    if isinstance(v, bool):
+        raise _CoerceError
+    if isinstance(v, int):
+        return v
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if isinstance(v, str):
+        try:
+            return int(v.strip())
+        except ValueError:
+            raise _CoerceError from None
+    raise _CoerceError
+
+
+def _to_number(v):
+    """默认值是 int 但没有类型注解时，也接受小数，例如默认超时 10 秒，用户写 0.5 秒"""
+    if isinstance(v, float):
+        return v
+    try:
+        return _to_int(v)
+    except _CoerceError:
+        if isinstance(v, str):
+            return _to_float(v)
+        raise
+
+
+def _to_float(v):
+    if isinstance(v, bool):
+        raise _CoerceError
+    if isinstance(v, (int, float)):
+        return float(v)
+    if isinstance(v, str):
+        try:
+            return float(v.strip())
+        except ValueError:
+            raise _CoerceError from None
+    raise _CoerceError
+
+
+def _to_str(v):
+    if isinstance(v, str):
+        return v
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return str(v)
+    raise _CoerceError
+
+
+def _make_json_container_coercer(target_type):
+    def _coerce(v):
+        if isinstance(v, str):
+            try:
+                v = json.loads(v)
+            except ValueError:
+                raise _CoerceError from None
+        if target_type is dict:
+            if isinstance(v, dict):
+                return v
+            raise _CoerceError
+        if isinstance(v, (list, tuple)):
+            return v if type(v) is target_type else target_type(v)
+        raise _CoerceError
+    return _coerce
+
+
+def _make_isinstance_checker(types: tuple):
+    def _coerce(v):
+        if isinstance(v, types):
+            return v
+        raise _CoerceError
+    return _coerce
+
+
+_COERCERS = {bool: _to_bool, int: _to_int, float: _to_float, str: _to_str,
+             list: _make_json_container_coercer(list), tuple: _make_json_container_coercer(tuple),
+             dict: _make_json_container_coercer(dict)}
+
+
+class FieldCoercer:
+    """单个配置项的类型校验/转换器"""
+    __slots__ = ('type_desc', 'is_none_allowed', 'coerce')
+
+    def __init__(self, type_desc: str, is_none_allowed: bool, coerce: typing.Callable):
+        self.type_desc = type_desc
+        self.is_none_allowed = is_none_allowed
+        self.coerce = coerce
+
+    def __call__(self, v):
+        if v is None and self.is_none_allowed:
+            return v
+        return self.coerce(v)
+
+
+def _compile_annotation(annotation) -> typing.Optional[FieldCoercer]:
+    origin = getattr(annotation, '__origin__', None)
+    args = getattr(annotation, '__args__', None) or ()
+    is_none_allowed = False
+    if origin is typing.Union:
+        is_none_allowed = type(None) in args
+        members = tuple(a for a in args if a is not type(None))
+        if len(members) == 1:
+            coercer = _compile_annotation(members[0])
+            if coercer is not None:
+                coercer.is_none_allowed = is_none_allowed
+            return coercer
+        member_types = tuple(getattr(a, '__origin__', None) or a for a in members)
+        if not all(isinstance(t, type) for t in member_types):
+            return None
+        desc = ' | '.join(t.__name__ for t in member_types)
+        return FieldCoercer(desc, is_none_allowed, _make_isinstance_checker(member_types))
+    target = origin or annotation  # typing.List[int] 之类的只校验外层容器类型
+    if not isinstance(target, type) or target is typing.Any:
+        return None
+    coerce = _COERCERS.get(target) or _make_isinstance_checker((target,))
+    return FieldCoercer(target.__name__, is_none_allowed, coerce)
+
+
+def _make_str_only_coercer(coerce: typing.Callable):
+    """没有类型注解时只转换字符串，其他类型的值原样保留，和以前不校验时一样"""
+    def _coerce(v):
+        return coerce(v) if isinstance(v, str) else v
+    return _coerce
+
+
+_INFERRED_COERCERS = {bool: ('bool', _make_str_only_coercer(_to_bool)),
+                      int: ('int | float', _make_str_only_coercer(_to_number)),
+                      float: ('float', _make_str_only_coercer(_to_float))}
+
+
+def _compile_from_default(default) -> typing.Optional[FieldCoercer]:
+    """没有类型注解时按默认值推断，只推断 bool/int/float ，只把字符串转换成这些类型，并且总是允许 None"""
+    inferred = _INFERRED_COERCERS.get(type(default))
+    if inferred is None:
+        return None
+    return FieldCoercer(inferred[0], True, inferred[1])
+
+
+def compile_schema(config_cls) -> typing.Dict[str, FieldCoercer]:
+    """编译配置类的 {配置名: 转换器}，结果缓存在类上，只编译一次"""
+    schema = config_cls.__dict__.get('__nb_schema__')
+    if schema is not None:
+        return schema
+    try:
+        annotations = typing.get_type_hints(config_cls)
+    except Exception:  # 注解中有无法解析的字符串时，退回到原始注解
+        annotations = dict(config_cls.__dict__.get('__annotations__', {}))
+    schema = {}
+    for k, default in config_cls._get_default_fields().items():
+        if isinstance(default, DataClassBase):  # 嵌套的配置实例按结构深度合并，由嵌套配置类自己的字段决定类型
+            continue
+        coercer = _compile_annotation(annotations[k]) if k in annotations else _compile_from_default(default)
+        if coercer is not None:
+            if k in annotations and default is None:
+                coercer.is_none_allowed = True
+            schema[k] = coercer
+    type.__setattr__(config_cls, '__nb_schema__', schema)
+    return schema
+
+
+def _find_file_source_line(file_name: str, cls_name: str, key: typing.Optional[str]) -> int:
+    """toml/json/yaml 用户配置文件按文本查找 section 之后第一个给 key 赋值的行，key 为 None 时返回 section 的行号"""
+    import re
+    try:
+        with open(file_name, encoding='utf-8-sig') as f:
+            lines = f.read().splitlines()
+    except (OSError, ValueError):
+        return 1
+    section_re = re.compile(rf'^\s*(\[\s*["\']?{re.escape(cls_name)}["\']?\s*\]|["\']?{re.escape(cls_name)}["\']?\s*:)')
+    key_re = re.compile(rf'^\s*["\']?{re.escape(key)}["\']?\s*[=:]') if key is not None else None
+    section_line = None
+    for i, line in enumerate(lines, 1):
+        if section_line is None:
+            if section_re.match(line):
+                section_line = i
+                if key_re is None:
+                    return i
+        elif key_re.match(line):
+            return i
+    return section_line or 1
+
+
+def find_assignment_line(file_name: str, cls_name: str, key: typing.Optional[str]) -> int:
+    """在用户配置文件中找到 class cls_name 里给 key 赋值的行号，找不到返回类定义的行号或者 1"""
+    if not file_name.endswith('.py'):
+        return _find_file_source_line(file_name, cls_name, key)
+    import ast  # 只有校验失败时才用到
+    try:
+        with open(file_name, encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError, ValueError, TypeError):
+        return 1
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == cls_name:
+            for stmt in node.body:
+                targets = stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target] if isinstance(stmt, ast.AnnAssign) else []
+                if any(isinstance(t, ast.Name) and t.id == key for t in targets):
+                    return stmt.lineno
+            return node.lineno
+    return 1
+
+
+def coerce_user_values(config_cls, user_values: dict, user_file: str, cls_name: str, errors: list,
+                       env_names: typing.Optional[dict] = None) -> dict:
+    """
+    按配置类的 schema 校验并转换用户配置的值，返回转换后的新字典。
+    默认值是嵌套的配置实例、用户写的是字典(或配置实例)时，按嵌套配置类的 schema 递归校验每个叶子，返回转换后的字典。
+    校验失败的配置项以 '"文件:行号" 说明' 的格式追加到 errors ，由调用方汇总后一起报错，嵌套的配置项报顶层配置项所在的行。
+    值来自环境变量时 env_names 是 {配置名: 环境变量名} ，报错时指出环境变量名而不是文件行号。
+    """
+    def _where(top_key: str) -> str:
+        if env_names is not None:
+            return f'环境变量 {env_names[top_key]}'
+        return f'"{user_file}:{find_assignment_line(user_file, cls_name, top_key) if user_file else 1}"'
+
+    return _coerce_values(config_cls, user_values, cls_name, None, _where, errors)
+
+
+def _coerce_values(config_cls, user_values: dict, field_path: str, top_key: typing.Optional[str],
+                   where: typing.Callable[[str], str], errors: list) -> dict:
+    schema = compile_schema(config_cls)
+    default_values = None
+    result = dict(user_values)
+    for k, v in user_values.items():
+        coercer = schema.get(k)
+        if coercer is None:
+            if not isinstance(v, (dict, DataClassBase)):
+                continue
+            if default_values is None:
+                default_values = config_cls._get_default_fields()
+            default = default_values.get(k)
+            if isinstance(default, DataClassBase):
+                nested_values = v._get_field_values() if isinstance(v, DataClassBase) else v
+                result[k] = _coerce_values(type(default), nested_values, f'{field_path}.{k}', top_key or k, where, errors)
+            continue
+        try:
+            result[k] = coercer(v)
+        except _CoerceError:
+            errors.append(f'{where(top_key or k)} {field_path}.{k} = {v!r} 的类型不对，'
+                          f'{config_cls.__module__}.{config_cls.__name__}.{k} 需要 {coercer.type_desc} 类型')
+    return result
@@ -0,0 +1,87 @@
+"""
+环境变量覆盖层，例如前缀为 MYLIB 时，环境变量 MYLIB__CONFIGKLS1__CONFIG_A=xx 覆盖 ConfigKLS1.config_a 。
+类名和配置名都不区分大小写，环境变量的字符串和用户配置一样按配置类的 schema 转换类型，嵌套的配置实例接受 json 对象并深度合并。
+"""
+import json
+import os
+import typing
+
+_TRUE_STRS = ('1', 'true', 'yes', 'on')
+_FALSE_STRS = ('0', 'false', 'no', 'off', '')
+
+
+def build_env_index(prefix: str, environ: typing.Mapping[str, str] = None) -> dict:
+    """
+    只扫描一次环境变量，返回 {类名大写: {配置名大写: (环境变量名, 环境变量值)}} ，
+    之后每个配置类、每个配置项都是字典查找，不再重复遍历 os.environ 。
+    """
+    environ = os.environ if environ is None else environ
+    head = f'{prefix.upper()}__'
+    index = {}
+    for env_name, raw in environ.items():
+        if not env_name.upper().startswith(head):
+            continue
+        parts = env_name[len(head):].split('__', 1)
+        if len(parts) != 2 or not parts[0] or not parts[1]:
+            continue
+        index.setdefault(parts[0].upper(), {})[parts[1].upper()] = (env_name, raw)
+    return index
+
+
+def parse_env_value(env_name: str, raw: str, default):
+    """
+    把环境变量的字符串初步解析成合并用的值: 默认值是 bool 时按开关字符串解析，是嵌套的配置实例时按 json 解析成字典，
+    是 list/tuple/dict 时按 json 解析成同样的容器，是 None 时尝试按 json 解析，失败就保留字符串。
+    其他类型保留字符串，由配置类的 schema 统一转换和校验，和用户配置文件中的字符串走同一套规则，
+    例如没有类型注解的 int 默认值也接受 0.5 。
+    """
+    from nb_config.simple_data_class import DataClassBase
+    if isinstance(default, bool):
+        lower = raw.strip().lower()
+        if lower in _TRUE_STRS:
+            return True
+        if lower in _FALSE_STRS:
+            return False
+        raise ValueError(f'环境变量 {env_name}={raw!r} 的值不能转换成 bool 类型，可以使用 {_TRUE_STRS} 或 {_FALSE_STRS}')
+    if isinstance(default, DataClassBase):
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = None
+        if not isinstance(value, dict):
+            raise ValueError(f'环境变量 {env_name}={raw!r} 需要是 json 对象，按字段深度合并到嵌套配置 {type(default).__name__}')
+        return value
+    if isinstance(default, (list, tuple, dict)):
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = None
+        if isinstance(default, dict) != isinstance(value, dict) or not isinstance(value, (list, dict)):
+            raise ValueError(f'环境变量 {env_name}={raw!r} 需要是 json {"对象" if isinstance(default, dict) else "数组"}')
+        return tuple(value) if isinstance(default, tuple) else value
+    if default is None:
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+def get_env_overrides(env_index: dict, cls_name: str, values: dict, default_values: dict) -> typing.Dict[str, tuple]:
+    """
+    从 build_env_index 的结果中取出配置类 cls_name 的覆盖值，返回 {配置名: (环境变量名, 初步解析的值)} ，
+    调用方再按配置类的 schema 转换类型并深度合并。
+    """
+    cls_env = env_index.get(cls_name.upper())
+    if not cls_env:
+        return {}
+    key_map = {k.upper(): k for k in values}
+    overrides = {}
+    for upper_key, (env_name, raw) in cls_env.items():
+        key = key_map.get(upper_key)
+        if key is None:
+            print(f'环境变量 {env_name} 没有对应的配置项 {cls_name}.{upper_key.lower()} ，已忽略')
+            continue
+        default = default_values[key] if key in default_values else values[key]
+        overrides[key] = (env_name, parse_env_value(env_name, raw, default))
+    return overrides
@@ -0,0 +1,220 @@
+"""
+非 python 的用户配置文件 (toml / json / yaml) 。
+运维可以用部署工具生成这些文件来覆盖三方包的配置，加载时只解析数据，不执行任何代码。
+文件的每个顶层 section 对应默认配置模块中同名的 DataClassBase 配置类，section 里的键值覆盖该类的同名配置项，
+嵌套的表/字典覆盖嵌套的配置实例，例如 toml:
+
+    [ConfigKLS1]
+    config_a = 'prod'
+
+    [ConfigKLS1.redis]
+    host = '10.0.0.2'
+
+大文件通过 mmap 读取，解析结果按内容的 sha1 缓存到磁盘，文件内容不变时后续进程启动不用再解析。
+"""
+import json
+import os
+from pathlib import Path
+import sys
+import typing
+
+from nb_config.simple_data_class import DataClassBase
+
+FILE_FORMATS = {'.toml': 'toml', '.json': 'json', '.yaml': 'yaml', '.yml': 'yaml'}
+
+_MMAP_MIN_SIZE = 64 * 1024  # 小于这个大小的文件直接读取解析，比 mmap 和读写缓存文件更快
+_PARSE_CACHE_FORMAT_VERSION = 2
+
+
+def get_file_format(user_config_path: str) -> typing.Optional[str]:
+    """根据后缀名判断用户配置是不是 toml/json/yaml 文件，是 python 模块的 import 路径时返回 None"""
+    return FILE_FORMATS.get(os.path.splitext(user_config_path)[1].lower())
+
+
+class FileConfigSource:
+    """解析好的用户配置文件，sections 的格式是 {配置类名: {配置名: 值}}"""
+    __slots__ = ('file_name', 'file_format', 'mtime_ns', 'sections')
+
+    def __init__(self, file_name: str, file_format: str, mtime_ns: int, sections: dict):
+        self.file_name = file_name
+        self.file_format = file_format
+        self.mtime_ns = mtime_ns
+        self.sections = sections
+
+
+def _loads_toml(text: str) -> dict:
+    try:
+        import tomllib
+    except ImportError:  # python 3.11 以下使用同样接口的 tomli
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ImportError('python 3.11 以下使用 toml 格式的用户配置文件需要先 pip install tomli') from None
+    return tomllib.loads(text)
+
+
+def _loads_yaml(text: str):
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError('使用 yaml 格式的用户配置文件需要先 pip install pyyaml') from None
+    return yaml.safe_load(text)
+
+
+_LOADERS = {'toml': _loads_toml, 'json': json.loads, 'yaml': _loads_yaml}
+
+
+def _parse_sections(file_name: str, file_format: str, text: str) -> dict:
+    data = _LOADERS[file_format](text)
+    if data is None:  # 空的 yaml 文件
+        return {}
+    if not isinstance(data, dict):
+        raise ValueError(f'"{file_name}:1" 的顶层必须是 {{配置类名: {{配置名: 值}}}} 的格式')
+    for section, values in data.items():
+        if not isinstance(values, dict):
+            raise ValueError(f'"{file_name}:1" 中的 {section} 必须是一个表/字典，对应默认配置模块中的同名配置类')
+    return data
+
+
+def _get_parse_cache_file(file_name: str, cache_dir):
+    from nb_config import merged_config_cache
+    import hashlib
+    cache_dir = Path(cache_dir) if cache_dir else merged_config_cache.get_default_cache_dir()
+    key = hashlib.sha1(os.path.abspath(file_name).encode()).hexdigest()
+    return cache_dir / f'parsed_{os.path.basename(file_name)}__{key[:16]}.marshal'
+
+
+def _get_parse_cache_header(digest: str) -> tuple:
+    # marshal 的格式随 python 版本变化，不同版本的解释器不共用解析缓存
+    return 'nb_config_parse_cache', _PARSE_CACHE_FORMAT_VERSION, tuple(sys.version_info[:2]), digest
+
+
+def _load_parse_cache(cache_file, digest: str) -> typing.Optional[dict]:
+    """
+    解析缓存用 marshal 保存，只能还原 dict/list/tuple/set/str/bytes/数字这些纯数据，读取缓存不会执行任何代码；
+    缓存目录还必须是当前用户私有的，见 merged_config_cache.is_private_cache_dir 。
+    """
+    import marshal
+    from nb_config import merged_config_cache
+    if not merged_config_cache.is_private_cache_dir(Path(cache_file).parent):
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            data = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(data, tuple) or len(data) != 2 or data[0] != _get_parse_cache_header(digest) \
+            or not isinstance(data[1], (dict, bool)):
+        return None
+    return data[1]
+
+
+def _write_parse_cache(cache_file, digest: str, sections: typing.Union[dict, bool]):
+    import marshal
+    from nb_config import merged_config_cache
+    try:
+        data = marshal.dumps((_get_parse_cache_header(digest), sections))
+    except ValueError:  # 有 marshal 不支持的值，例如 toml/yaml 中的日期时间，这种文件每次都重新解析
+        return
+    try:
+        merged_config_cache.atomic_write_bytes(Path(cache_file), data)
+    except OSError as e:  # 缓存目录不可写时只是每次都重新解析
+        print(f'不能写入用户配置文件的解析缓存 {cache_file} : {type(e).__name__}: {e}')
+
+
+def load_file_config_source(file_name: str, cache_dir=None) -> FileConfigSource:
+    """
+    解析用户配置文件。文件不小于 64KB 时通过 mmap 计算 sha1 ，内容和磁盘缓存一致时直接返回缓存的解析结果，
+    不需要把文件读成 bytes 再解析；否则从 mmap 直接解码解析，并把结果写入缓存。
+    cache_dir 为 None 时使用和跨进程合并配置缓存相同的目录。
+    """
+    file_format = get_file_format(file_name)
+    if file_format is None:
+        raise ValueError(f'不支持的用户配置文件格式 {file_name} ，支持的后缀名是 {list(FILE_FORMATS)}')
+    with open(file_name, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if st.st_size < _MMAP_MIN_SIZE:
+            sections = _parse_sections(file_name, file_format, f.read().decode('utf-8-sig'))
+            return FileConfigSource(file_name, file_format, st.st_mtime_ns, sections)
+        import hashlib
+        import mmap
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            digest = hashlib.sha1(mm).hexdigest()
+            cache_file = _get_parse_cache_file(file_name, cache_dir)
+            sections = _load_parse_cache(cache_file, digest)
+            if sections is None:
+                sections = _parse_sections(file_name, file_format, str(mm, 'utf-8-sig'))
+                _write_parse_cache(cache_file, digest, sections)
+    return FileConfigSource(file_name, file_format, st.st_mtime_ns, sections)
+
+
+def _to_plain_value(v):
+    if isinstance(v, DataClassBase):
+        return {k: _to_plain_value(sub_v) for k, sub_v in v._get_field_values().items()}
+    if isinstance(v, tuple):
+        return [_to_plain_value(item) for item in v]
+    return v
+
+
+def _toml_value(v) -> typing.Optional[str]:
+    """把值转成 toml 的字面量，toml 不能表示的值(例如 None)返回 None"""
+    if isinstance(v, bool):
+        return 'true' if v else 'false'
+    if isinstance(v, float) and (v != v or v in (float('inf'), float('-inf'))):
+        return 'nan' if v != v else 'inf' if v > 0 else '-inf'
+    if isinstance(v, (int, float)):
+        return repr(v)
+    if isinstance(v, str):
+        return json.dumps(v, ensure_ascii=False)
+    if isinstance(v, list):
+        items = [_toml_value(item) for item in v]
+        return None if None in items else f'[{", ".join(items)}]'
+    if isinstance(v, dict):
+        items = [(k, _toml_value(sub_v)) for k, sub_v in v.items()]
+        if any(item is None for _, item in items):
+            return None
+        return '{' + ', '.join(f'{_toml_key(k)} = {item}' for k, item in items) + '}'
+    return None
+
+
+def _toml_key(k) -> str:
+    k = str(k)
+    return k if k and all(c.isalnum() and c < '\x80' or c in '_-' for c in k) else json.dumps(k, ensure_ascii=False)
+
+
+def _dump_toml_table(lines: list, table_name: str, values: dict):
+    lines.append(f'[{table_name}]')
+    sub_tables = []
+    for k, v in values.items():
+        if isinstance(v, dict) and v:
+            sub_tables.append((k, v))
+            continue
+        literal = _toml_value(v)
+        if literal is None:
+            lines.append(f'# {_toml_key(k)} = {v!r}    # toml 不能表示这个值，需要修改时请换成 toml 支持的类型')
+        else:
+            lines.append(f'{_toml_key(k)} = {literal}')
+    lines.append('')
+    for k, v in sub_tables:
+        _dump_toml_table(lines, f'{table_name}.{_toml_key(k)}', v)
+
+
+def dump_file_config_template(config_classes: typing.Iterable[typing.Tuple[str, type]], file_format: str) -> str:
+    """用默认配置类的默认值生成 toml/json/yaml 格式的用户配置文件模板，config_classes 是 [(配置类名, 配置类)]"""
+    sections = {name: {k: _to_plain_value(v) for k, v in config_cls._get_default_fields().items()}
+                for name, config_cls in config_classes}
+    if file_format == 'toml':
+        lines = ['# 只需要保留要修改的配置项，删掉的配置项使用三方包的默认值', '']
+        for name, values in sections.items():
+            _dump_toml_table(lines, _toml_key(name), values)
+        return '\n'.join(lines)
+    if file_format == 'json':
+        return json.dumps(sections, ensure_ascii=False, indent=4, default=str) + '\n'
+    if file_format == 'yaml':
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError('使用 yaml 格式的用户配置文件需要先 pip install pyyaml') from None
+        return ('# 只需要保留要修改的配置项，删掉的配置项使用三方包的默认值\n'
+                + yaml.safe_dump(json.loads(json.dumps(sections, default=str)), allow_unicode=True, sort_keys=False))
+    raise ValueError(f'不支持的用户配置文件格式 {file_format}')
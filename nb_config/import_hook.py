@@ -0,0 +1,96 @@
+"""
+模块导入后的钩子。
+给某个模块注册钩子后，模块已经导入就立即调用；还没导入时，在 sys.meta_path 最前面插入一个查找器，
+只包装注册了钩子的模块的 loader ，模块代码执行完后立刻调用钩子，其他模块的导入只多一次字典查找。
+钩子抛出的异常不会被吞掉，会让这次 import 失败，和模块代码本身出错一样，没执行成功的钩子在下次 import 时重新执行。
+"""
+import sys
+import threading
+import typing
+
+_post_import_hooks = {}  # 模块名 -> [callback(module)] ，每个钩子只调用一次
+_hooks_lock = threading.RLock()
+_finder = None
+
+
+class _PostImportHookLoader:
+    """包装真正的 loader ，exec_module 执行完模块代码后调用该模块的钩子，其他属性都转发给原来的 loader"""
+
+    def __init__(self, loader):
+        self.loader = loader
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.loader.exec_module(module)
+        run_post_import_hooks(module)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class _PostImportHookFinder:
+    """放在 sys.meta_path 最前面，只处理注册了钩子的模块，用后面的查找器找到真正的 spec 后替换 loader"""
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname not in _post_import_hooks:
+            return None
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+            find_spec = getattr(finder, 'find_spec', None)
+            if find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module') \
+                and not isinstance(spec.loader, _PostImportHookLoader):
+            spec.loader = _PostImportHookLoader(spec.loader)
+        return spec
+
+
+def _install_finder():
+    global _finder
+    if _finder is None:
+        _finder = _PostImportHookFinder()
+    if _finder not in sys.meta_path:
+        sys.meta_path.insert(0, _finder)
+
+
+def _is_waiting_for_exec(module) -> bool:
+    """模块正在被导入(循环导入时已经在 sys.modules 中)，并且是由我们包装的 loader 执行的，执行完后会调用钩子"""
+    spec = getattr(module, '__spec__', None)
+    return bool(spec is not None and getattr(spec, '_initializing', False)
+                and isinstance(spec.loader, _PostImportHookLoader))
+
+
+def register_post_import_hook(module_name: str, callback: typing.Callable[[typing.Any], typing.Any]):
+    """模块 module_name 已经导入时立即调用 callback(module)，否则在它第一次被导入、模块代码执行完后调用"""
+    with _hooks_lock:
+        module = sys.modules.get(module_name)
+        if module is None or _is_waiting_for_exec(module):
+            _post_import_hooks.setdefault(module_name, []).append(callback)
+            _install_finder()
+            return
+    callback(module)
+
+
+def run_post_import_hooks(module):
+    with _hooks_lock:
+        callbacks = _post_import_hooks.pop(module.__name__, ())
+    for i, callback in enumerate(callbacks):
+        try:
+            callback(module)
+        except BaseException:
+            # 这次 import 失败了，模块会从 sys.modules 中移除，没执行成功的钩子留到下次 import 时再执行
+            with _hooks_lock:
+                _post_import_hooks.setdefault(module.__name__, [])[:0] = callbacks[i:]
+            raise
+
+
+def has_pending_post_import_hooks(module_name: str) -> bool:
+    return module_name in _post_import_hooks
@@ -1,14 +1,71 @@
 import importlib
-import inspect
-import multiprocessing
+import importlib.util
+import os
 from pathlib import Path
-from shutil import copyfile
 import sys
+import threading
+import time
+import typing
+import weakref
 
-from nb_config.simple_data_class import DataClassBase
+from nb_config.simple_data_class import DataClassBase, DataClassMeta, is_same_config_value, merge_config_value
 
 def is_main_process():
-    return multiprocessing.process.current_process().name == 'MainProcess'
+    from multiprocessing import process  # 延迟导入，import nb_config 时不加载 multiprocessing
+    return process.current_process().name == 'MainProcess'
+
+
+_user_module_mtimes = {}  # 用户配置模块 import 路径(或用户配置文件路径) -> 上次执行该模块(解析该文件)时文件的 mtime_ns
+_async_import_locks = weakref.WeakKeyDictionary()  # 事件循环 -> {用户配置模块 import 路径: asyncio.Lock}
+
+
+def _get_module_file_mtime(m):
+    try:
+        return os.stat(m.__file__).st_mtime_ns
+    except (TypeError, OSError):  # 没有 __file__ 的模块，例如 namespace package
+        return None
+
+def _remove_cached_bytecode(m):
+    """
+    pyc 只按源文件 mtime 的整数秒和文件大小判断是否过期，同一秒内修改并且大小不变时 reload 会执行旧的 pyc ，
+    所以 reload 用户配置模块之前先删掉它的 pyc ，强制重新编译源文件。
+    """
+    cached = getattr(m, '__cached__', None)
+    if cached:
+        try:
+            os.remove(cached)
+        except OSError:  # 没有生成过 pyc ，或者没有权限
+            pass
+
+
+def iter_module_config_classes(m):
+    """
+    得到模块 m 命名空间中的所有配置类 (模块中的名字, 类)，包括从别的模块导入再导出的配置类，和以前 dir(m) 找到的配置类相同。
+    只遍历一次 vars(m) 并且只比较元类，不需要 dir() 排序和 inspect.isclass/issubclass 。
+    """
+    for name, v in vars(m).items():
+        if isinstance(v, DataClassMeta) and v is not DataClassBase:
+            yield name, v
+
+
+def _iter_overridden_keys(merged_config_list: list):
+    """合并结果中和三方包默认值不同的配置项 (类名, 配置名)"""
+    for name, dest_cls, values in merged_config_list:
+        default_values = dest_cls._get_default_fields()
+        for k, v in values.items():
+            if not is_same_config_value(default_values.get(k), v):
+                yield name, k
+
+
+def _count_overridden_keys(merged_config_list: list) -> int:
+    """合并结果中和三方包默认值不同的配置项个数"""
+    return sum(1 for _ in _iter_overridden_keys(merged_config_list))
+
+
+FINAL_CONFIG_PRINT_MODES = ('full', 'background', 'summary', 'none')
+USER_CONFIG_LOAD_MODES = ('import', 'literal', 'literal_only')
+_SUMMARY_MAX_KEYS = 20  # 一行汇总中最多列出的被覆盖配置项个数
+
 
 class UserConfigAutoImporter:
     """
@@ -18,11 +75,52 @@ class UserConfigAutoImporter:
     def __init__(self,user_config_module_path:str,default_config_module_path:str,
                  is_auto_create_user_config_file:bool=True,
                  is_show_final_config:bool=True,
+                 is_reload_user_config:bool=False,
+                 env_prefix:str=None,
+                 is_use_process_cache:bool=False,
+                 process_cache_dir:str=None,
+                 is_profile_merge:bool=False,
+                 merge_report_hook:typing.Callable[['MergeReport'], typing.Any]=None,
+                 merge_report_logger:typing.Union[str, 'logging.Logger']=None,
+                 final_config_print_mode:str='full',
+                 final_config_print_interval:float=0,
+                 user_config_load_mode:str='import',
                  ):
-        self.user_config_module_path=user_config_module_path # 用户配置模块的python import 路径
+        # 环境变量、schema、文件配置源、合并报告这些模块都在第一次合并时才导入，加快 import nb_config
+        from nb_config.file_config_source import get_file_format
+        self.user_config_module_path=user_config_module_path # 用户配置模块的python import 路径，也可以是 .toml/.json/.yaml 用户配置文件的路径
+        self.user_config_file_format=get_file_format(user_config_module_path) # 用户配置是python模块时为None，否则是 toml/json/yaml
         self.default_config_module_path=default_config_module_path # 默认配置文件的python import路径
         self.is_auto_create_user_config_file=is_auto_create_user_config_file
         self.is_show_final_config=is_show_final_config
+        self.is_reload_user_config=is_reload_user_config # 为True时每次都强制 reload 用户配置模块，否则只有文件变化了才 reload
+        self.env_prefix=env_prefix # 例如 MYLIB ，则环境变量 MYLIB__CONFIGKLS1__CONFIG_A 覆盖 ConfigKLS1.config_a ，为None不使用环境变量
+        self.is_use_process_cache=is_use_process_cache # 为True时主进程把合并结果写到缓存文件，spawn的子进程直接读取缓存，不再执行用户配置模块
+        self.process_cache_dir=process_cache_dir # 缓存文件夹，为None时使用系统临时文件夹下的 nb_config_cache_用户名
+        self.merge_report_hook=merge_report_hook # 每次合并后用 MergeReport 调用这个函数
+        self.merge_report_logger=merge_report_logger # 日志名或者 logging.Logger ，每次合并后把 MergeReport 作为一条 INFO 日志发出去
+        self.is_profile_merge=is_profile_merge or merge_report_hook is not None or merge_report_logger is not None # 为True时记录合并各阶段的耗时和计数
+        self.last_merge_report:typing.Optional['MergeReport']=None # 开启 is_profile_merge 时，最近一次合并的报告
+        if final_config_print_mode not in FINAL_CONFIG_PRINT_MODES:
+            raise ValueError(f'final_config_print_mode 只能是 {FINAL_CONFIG_PRINT_MODES} 中的一个，不能是 {final_config_print_mode!r}')
+        # is_show_final_config 为True时最终配置的打印方式: full 同步打印每个配置类的完整json(默认)，background 在后台线程生成并打印完整json，
+        # summary 只打印一行汇总(被覆盖的配置项名字，不打印值)，none 不打印，需要时调用 render_final_config() 生成
+        self.final_config_print_mode=final_config_print_mode
+        self.final_config_print_interval=final_config_print_interval # 大于0时，距离上次打印不到这么多秒的合并不打印最终配置，例如 watch 频繁重新加载时
+        if user_config_load_mode not in USER_CONFIG_LOAD_MODES:
+            raise ValueError(f'user_config_load_mode 只能是 {USER_CONFIG_LOAD_MODES} 中的一个，不能是 {user_config_load_mode!r}')
+        # python 用户配置模块的加载方式: import 执行模块(默认)，literal 先用 ast 静态解析纯字面量的配置模块，有非字面量的写法时退回 import ，
+        # literal_only 只静态解析，不是纯字面量的配置模块直接报错，适合不允许执行用户代码的进程
+        self.user_config_load_mode=user_config_load_mode
+        self._parsed_user_config_file = None  # 静态解析的用户配置模块文件，这种情况下用户配置模块没有被导入
+        self._last_final_config_print_time = None
+        self._skipped_final_config_print_count = 0
+        self._final_config_print_thread = None
+        self._change_callbacks = []
+        self._applied_keys = {}  # 默认配置类 -> 上次合并时这个导入器从用户配置(和环境变量)设置的配置名
+        self._pending_applied_keys = {}  # 准备好但还没设置到默认配置类上的合并结果中，来自用户配置的配置名
+        self._is_print_import_banner = True  # 批量导入时由汇总信息代替每个导入器各自打印的导入信息
+        self._watch_stop_event = None
         
     def auto_create_user_config_file(self):
         if '/lib/python' in sys.path[1] or r'\lib\python' in sys.path[1] or '.zip' in sys.path[1]:
@@ -41,36 +139,67 @@ class UserConfigAutoImporter:
             raise EnvironmentError(f'''如果用户配置模块不能被自动导入，又不希望自动创建，请先在会话窗口设置临时PYTHONPATH为你的配置文件所在的文件夹，
                                ''')
         
-        # 解析模块路径，支持多级目录结构
         project_root = Path(sys.path[1])
-        module_parts = self.user_config_module_path.split('.')
-        
-        # 构建目录路径和文件路径
-        if len(module_parts) > 1:
-            # 多级目录情况，如 configs.py_configs.my_config
-            dir_parts = module_parts[:-1]  # ['configs', 'py_configs']
-            file_name = module_parts[-1]   # 'my_config'
-            
-            # 创建目录结构
-            current_path = project_root
-            for dir_part in dir_parts:
-                current_path = current_path / dir_part
-                current_path.mkdir(exist_ok=True)
-                
-                # 确保每个目录都有 __init__.py 文件
-                init_file = current_path / '__init__.py'
-                if not init_file.exists():
-                    init_file.write_text('# Auto-generated __init__.py\n', encoding='utf-8')
-            
-            target_file_name = current_path / f'{file_name}.py'
-        else:
-            # 单级文件情况，如 config_user2
-            target_file_name = project_root / f'{self.user_config_module_path}.py'
+        if self.user_config_file_format is not None:
+            self._create_user_config_file_from_template(project_root)
+            return
+
+        target_file_name = self._get_auto_create_file()
+        # 多级目录情况，如 configs.py_configs.my_config ，创建目录结构
+        current_path = project_root
+        for dir_part in self.user_config_module_path.split('.')[:-1]:  # ['configs', 'py_configs']
+            current_path = current_path / dir_part
+            current_path.mkdir(exist_ok=True)
+
+            # 确保每个目录都有 __init__.py 文件
+            init_file = current_path / '__init__.py'
+            if not init_file.exists():
+                init_file.write_text('# Auto-generated __init__.py\n', encoding='utf-8')
         
+        from shutil import copyfile
         source_file_name = importlib.import_module(self.default_config_module_path).__file__
         copyfile(source_file_name, target_file_name)
         print(f'在  {project_root} 目录下自动生成了一个文件， 请刷新文件夹查看或修改 \n "{target_file_name}:1" 文件')
-        
+
+    def _get_auto_create_file(self) -> Path:
+        """python 用户配置模块不存在时，自动创建的文件路径，例如 configs.py_configs.my_config -> sys.path[1]/configs/py_configs/my_config.py"""
+        module_parts = self.user_config_module_path.split('.')
+        return Path(sys.path[1]).joinpath(*module_parts[:-1], f'{module_parts[-1]}.py')
+
+    def _is_user_config_module_missing(self, e: ModuleNotFoundError) -> bool:
+        """
+        导入用户配置时的 ModuleNotFoundError 是否是用户配置模块(或者它的上级包)本身不存在，并且自动创建的位置也没有文件。
+        用户配置模块里 import 了不存在的模块(例如 @nb_config_class 的目标写错了)时不能当成用户配置不存在，否则会用默认配置覆盖用户的配置文件
+        """
+        path = self.user_config_module_path
+        return bool(e.name) and (e.name == path or path.startswith(e.name + '.')) and not self._get_auto_create_file().exists()
+
+    def _create_user_config_file_from_template(self, project_root: Path):
+        """用户配置是 toml/json/yaml 文件时，用默认配置类的默认值生成同样格式的模板"""
+        from nb_config.file_config_source import dump_file_config_template
+        target_file_name = Path(self.get_user_config_file())
+        dest_m = importlib.import_module(self.default_config_module_path)
+        template = dump_file_config_template(iter_module_config_classes(dest_m), self.user_config_file_format)
+        target_file_name.parent.mkdir(parents=True, exist_ok=True)
+        target_file_name.write_text(template, encoding='utf-8')
+        print(f'在  {project_root} 目录下自动生成了一个文件， 请刷新文件夹查看或修改 \n "{target_file_name}:1" 文件')
+
+    def get_user_config_file(self) -> typing.Optional[str]:
+        """
+        用户配置文件的路径。用户配置是 toml/json/yaml 文件时，相对路径和 python 模块一样按 sys.path 的顺序查找，
+        都不存在时返回自动创建的位置 sys.path[1] 下的路径；用户配置是 python 模块时返回已导入模块的 __file__ ，还没导入时返回 None
+        """
+        if self.user_config_file_format is None:
+            m = sys.modules.get(self.user_config_module_path)
+            return getattr(m, '__file__', None) if m is not None else self._parsed_user_config_file
+        if os.path.isabs(self.user_config_module_path):
+            return self.user_config_module_path
+        for path in sys.path:
+            file_name = os.path.join(path or os.getcwd(), self.user_config_module_path)
+            if os.path.isfile(file_name):
+                return os.path.abspath(file_name)
+        return os.path.abspath(os.path.join(sys.path[1], self.user_config_module_path))
+
 
     def auto_import_user_config(self):
         """
@@ -85,45 +214,446 @@ class UserConfigAutoImporter:
         Raises:
             ImportError: 当模块无法找到时，提供详细的解决方案
         """
+        self._finish_merge(*self._prepare_merge_or_create_user_config_file())
+
+    def install_import_hook(self):
+        """
+        auto_import_user_config 的延迟版本，不立即导入任何模块，只在 sys.meta_path 中登记一个导入钩子:
+        默认配置模块第一次被 import 时，模块代码执行完后立刻导入用户配置模块并合并，然后才把模块返回给 import 语句，
+        所以三方包从 import 得到的配置类已经是合并后的。程序从头到尾没有用到三方包时，不会有任何配置的开销。
+        默认配置模块已经导入过时立即合并，和 auto_import_user_config 一样。合并出错时那次 import 失败，下次 import 重新合并。
+        """
+        from nb_config.import_hook import register_post_import_hook
+        register_post_import_hook(self.default_config_module_path, lambda dest_m: self.auto_import_user_config())
+        return self
+
+    async def auto_import_user_config_async(self, executor=None) -> dict:
+        """
+        auto_import_user_config 的 asyncio 版本，适合在已经运行的事件循环中(加载插件、按租户加载配置)调用。
+        创建配置文件、执行用户配置模块这些阻塞操作放到线程池 executor 中执行，
+        然后在事件循环线程中一次性把合并结果设置到默认配置类上，协程不会读到合并了一半的配置，
+        最终配置的生成和打印也放到 executor 中执行，订阅者的回调在事件循环线程中调用。
+        同一个用户配置模块的并发调用会排队执行。
+        """
+        import asyncio  # 延迟导入，不使用异步接口的项目不加载 asyncio
+        loop = asyncio.get_event_loop()
+        locks = _async_import_locks.setdefault(loop, {})
+        lock = locks.get(self.user_config_module_path)
+        if lock is None:
+            lock = locks[self.user_config_module_path] = asyncio.Lock()
+        async with lock:
+            dest_m, merged_config_list, report = await loop.run_in_executor(
+                executor, self._prepare_merge_or_create_user_config_file)
+            diff = self._apply_prepared_merge(merged_config_list, report)
+            if self.is_show_final_config:
+                await loop.run_in_executor(executor, self._show_final_config, dest_m, merged_config_list, report)
+            self._notify_merged(diff, report)
+            return diff
+
+    def import_user_config_module(self):
+        """
+        导入用户配置模块，保证模块代码只执行一次。
+        模块已经导入过时，只有 is_reload_user_config 为True 或者配置文件在上次执行后被修改过，才会 reload 。
+        """
+        m = sys.modules.get(self.user_config_module_path)
+        if m is None:
+            m = importlib.import_module(self.user_config_module_path)
+        else:
+            last_mtime = _user_module_mtimes.get(self.user_config_module_path)
+            if self.is_reload_user_config or (last_mtime is not None and _get_module_file_mtime(m) != last_mtime):
+                _remove_cached_bytecode(m)
+                m = importlib.reload(m)
+        _user_module_mtimes[self.user_config_module_path] = _get_module_file_mtime(m)
+        return m
+
+    def load_user_config_file(self) -> 'FileConfigSource':
+        """解析 toml/json/yaml 用户配置文件，不执行任何代码，大文件的解析结果按内容缓存在 process_cache_dir"""
+        from nb_config.file_config_source import load_file_config_source
+        source = load_file_config_source(self.get_user_config_file(), self.process_cache_dir)
+        _user_module_mtimes[self.user_config_module_path] = source.mtime_ns
+        return source
+
+    def load_user_config_module(self):
+        """
+        按 user_config_load_mode 加载 python 用户配置模块，返回导入的模块，或者静态解析得到的 FileConfigSource (file_format 为 'python')
+        """
+        if self.user_config_load_mode == 'import':
+            return self.import_user_config_module()
+        from nb_config.literal_config_source import load_literal_config_source, NotLiteralConfigError
         try:
-            self.overwrite_default_config_with_user_config()
-        except ModuleNotFoundError:
-            self.auto_create_user_config_file()
-            self.overwrite_default_config_with_user_config()
-            
+            source = load_literal_config_source(self.user_config_module_path, self.process_cache_dir)
+        except NotLiteralConfigError:
+            if self.user_config_load_mode == 'literal_only':
+                raise
+            self._parsed_user_config_file = None
+            return self.import_user_config_module()
+        self._parsed_user_config_file = source.file_name
+        _user_module_mtimes[self.user_config_module_path] = source.mtime_ns
+        return source
+
     def overwrite_default_config_with_user_config(self):
-        m= importlib.import_module(self.user_config_module_path)
-        importlib.reload(m) 
-        print(f'''import {self.user_config_module_path} 成功 ,使用 "{m.__file__}:1"  作为了配置文件''')
+        return self._finish_merge(*self._prepare_merge())
+
+    def _prepare_merge_or_create_user_config_file(self):
+        if self.user_config_file_format is not None:
+            if not os.path.isfile(self.get_user_config_file()):
+                self.auto_create_user_config_file()
+            return self._prepare_merge()
+        try:
+            return self._prepare_merge()
+        except ModuleNotFoundError as e:
+            if not self._is_user_config_module_missing(e):
+                raise
+            self.auto_create_user_config_file()
+            return self._prepare_merge()
+
+    def _prepare_merge(self):
+        """
+        合并的准备阶段，包含所有文件io和执行用户配置模块的操作，但不修改任何默认配置类。
+        返回 (默认配置模块, [(类名, 默认配置类, 合并后的字段值)], 合并报告)，没开启 is_profile_merge 时合并报告是 None
+        """
+        from nb_config.file_config_source import FileConfigSource
+        from nb_config.merge_report import MergeReport
+        report = MergeReport(self.user_config_module_path, self.default_config_module_path) if self.is_profile_merge else None
+        if self.is_use_process_cache and not is_main_process():
+            prepared = self._prepare_merge_from_process_cache()
+            if report is not None:
+                report.mark('read_process_cache')
+            if prepared is not None:
+                if report is not None:
+                    report.is_from_process_cache = True
+                return prepared + (report,)
+        is_print_import_banner = self._is_print_import_banner and self.final_config_print_mode in ('full', 'background')
+        if self.user_config_file_format is not None:
+            m = self.load_user_config_file()
+            user_file = m.file_name
+            if is_print_import_banner:
+                print(f'''使用 "{user_file}:1"  作为了配置文件''')
+        else:
+            m = self.load_user_config_module()
+            if isinstance(m, FileConfigSource):
+                user_file = m.file_name
+                if is_print_import_banner:
+                    print(f'''解析 {self.user_config_module_path} 成功(没有执行模块代码) ,使用 "{user_file}:1"  作为了配置文件''')
+            else:
+                user_file = m.__file__
+                if is_print_import_banner:
+                    print(f'''import {self.user_config_module_path} 成功 ,使用 "{user_file}:1"  作为了配置文件''')
+        if report is not None:
+            report.user_config = user_file
+            report.mark('import_user_config')
         dest_m = importlib.import_module(self.default_config_module_path)
         # importlib.reload(dest_m)
-        for name in dir(dest_m):
-            config_cls = getattr(dest_m, name)
-            # 检查是否为类，且是 DataClassBase 的子类（但不是 DataClassBase 本身）
-            if (inspect.isclass(config_cls) and 
-                issubclass(config_cls, DataClassBase) and 
-                config_cls is not DataClassBase):
-                    dest_cls = getattr(dest_m,name)
-                    dest_cls.update_cls_attribute(**getattr(m,name)().get_dict()) # 将用户配置的值更新到默认配置中
-                    dest_cls.has_merged_config = True
-                    if self.is_show_final_config:
-                        if is_main_process():
-                            print(f'{dest_m.__name__}.{name} 的最终融合配置: {config_cls().get_pwd_enc_json()}')
+        if report is not None:
+            report.mark('import_default_config')
+        merged_config_list = self._build_merged_config(m, dest_m)
+        if report is not None:
+            report.mark('build_merged_config')
+        if self.is_use_process_cache and is_main_process() and user_file and dest_m.__file__:
+            from nb_config import merged_config_cache  # 没开启缓存时不加载 pickle/hashlib/tempfile
+            cache_file = merged_config_cache.get_cache_file(user_file, dest_m.__file__,
+                                                            merged_config_cache.get_process_cache_token(is_main=True),
+                                                            self.process_cache_dir)
+            if merged_config_cache.write_merged_config_cache(cache_file, (user_file, dest_m.__file__), self._get_env_index(),
+                                                             {name: values for name, _, values in merged_config_list}):
+                merged_config_cache.remove_stale_cache_files(cache_file)
+            if report is not None:
+                report.mark('write_process_cache')
+        return dest_m, merged_config_list, report
+
+    def _finish_merge(self, dest_m, merged_config_list: list, report: typing.Optional['MergeReport'] = None) -> dict:
+        """把准备好的合并结果设置到默认配置类上，打印最终配置，通知订阅者"""
+        diff = self._apply_prepared_merge(merged_config_list, report)
+        self._show_final_config(dest_m, merged_config_list, report)
+        self._notify_merged(diff, report)
+        return diff
+
+    def _apply_prepared_merge(self, merged_config_list: list, report: typing.Optional['MergeReport'] = None) -> dict:
+        if report is not None:
+            report.resume()
+        diff = self._apply_merged_config(merged_config_list)
+        self._applied_keys.update(self._pending_applied_keys)
+        if report is not None:
+            report.mark('apply_merged_config')
+            report.class_count = len(merged_config_list)
+            report.changed_count = sum(len(changed) for changed in diff.values())
+            report.override_count = _count_overridden_keys(merged_config_list)
+            report.resume()  # 统计计数是开启报告后才有的开销，不算到任何阶段
+        return diff
+
+    def _show_final_config(self, dest_m, merged_config_list: list, report: typing.Optional['MergeReport'] = None):
+        """is_show_final_config 为True时打印最终配置，生成完整json和写终端都是阻塞操作，异步导入时在线程池中调用"""
+        if self.is_show_final_config:
+            if is_main_process():
+                printed_bytes = self._print_final_config(dest_m, merged_config_list)
+                if report is not None:
+                    report.printed_bytes += printed_bytes
+            if report is not None:
+                report.mark('print_final_config')
         # importlib.reload(dest_m) # 这个不能加，不然又恢复了默认值
-   
-    def check_all_default_config_has_merged(self):
+
+    def _notify_merged(self, diff: dict, report: typing.Optional['MergeReport'] = None):
+        if diff:
+            for callback in self._change_callbacks:
+                callback(diff)
+            if report is not None and self._change_callbacks:
+                report.mark('callbacks')
+        if report is not None:
+            from nb_config.merge_report import emit_merge_report
+            self.last_merge_report = report
+            emit_merge_report(report, self.merge_report_hook, self.merge_report_logger)
+
+    def _print_final_config(self, dest_m, merged_config_list: list) -> int:
+        """按 final_config_print_mode 打印最终配置，返回同步打印的字节数"""
+        if self.final_config_print_mode == 'none':
+            return 0
+        now = time.monotonic()
+        if (self.final_config_print_interval and self._last_final_config_print_time is not None
+                and now - self._last_final_config_print_time < self.final_config_print_interval):
+            self._skipped_final_config_print_count += 1
+            return 0
+        self._last_final_config_print_time = now
+        texts = []
+        if self._skipped_final_config_print_count:
+            texts.append(f'{dest_m.__name__} 距离上次打印最终配置不到 {self.final_config_print_interval} 秒，'
+                         f'省略了 {self._skipped_final_config_print_count} 次打印')
+            self._skipped_final_config_print_count = 0
+        if self.final_config_print_mode == 'summary':
+            texts.append(self._render_final_config_summary(dest_m, merged_config_list))
+        elif self.final_config_print_mode == 'background':
+            # 在当前线程取好配置实例的快照，后台线程生成json时不会看到之后的合并；按顺序等上一次的后台打印结束
+            snapshots = [(name, dest_cls()) for name, dest_cls, _ in merged_config_list]
+            thread = threading.Thread(target=self._print_final_config_in_background,
+                                      args=(self._final_config_print_thread, dest_m.__name__, texts, snapshots),
+                                      name=f'nb_config_print_{self.default_config_module_path}')
+            self._final_config_print_thread = thread
+            thread.start()  # 不是 daemon 线程，进程退出前会打印完
+            return 0
+        else:
+            texts.extend(f'{dest_m.__name__}.{name} 的最终融合配置: {dest_cls().get_pwd_enc_json()}'
+                         for name, dest_cls, _ in merged_config_list)
+        for text in texts:
+            print(text)
+        return sum(len(text.encode('utf-8')) for text in texts)
+
+    @staticmethod
+    def _print_final_config_in_background(previous_thread, dest_module_name: str, texts: list, snapshots: list):
+        if previous_thread is not None:
+            previous_thread.join()
+        for text in texts:
+            print(text)
+        for name, config in snapshots:
+            print(f'{dest_module_name}.{name} 的最终融合配置: {config.get_pwd_enc_json()}')
+
+    def _render_final_config_summary(self, dest_m, merged_config_list: list) -> str:
+        overridden_keys = [f'{name}.{k}' for name, k in _iter_overridden_keys(merged_config_list)]
+        listed_keys = ', '.join(overridden_keys[:_SUMMARY_MAX_KEYS])
+        if len(overridden_keys) > _SUMMARY_MAX_KEYS:
+            listed_keys += f' 等 {len(overridden_keys)} 个'
+        user_file = self.get_user_config_file() or self.user_config_module_path
+        return (f'nb_config 使用 "{user_file}:1" 合并了 {dest_m.__name__} 的 {len(merged_config_list)} 个配置类，'
+                f'{len(overridden_keys)} 个配置项被覆盖: [{listed_keys}]')
+
+    def render_final_config(self, is_summary: bool = False) -> str:
+        """
+        按需生成最终配置的文本，不打印。final_config_print_mode 为 none 时，需要查看最终配置再调用这个方法。
+        is_summary 为True时生成一行汇总，否则生成每个配置类密码打码后的完整json
+        """
         dest_m = importlib.import_module(self.default_config_module_path)
-        for name in dir(dest_m):
-            config_cls = getattr(dest_m, name)
-            if (inspect.isclass(config_cls) and 
-                issubclass(config_cls, DataClassBase) and 
-                config_cls is not DataClassBase):
-                if  config_cls.has_merged_config is False:
-                    raise ValueError(f'{dest_m.__name__}.{name} 的配置没有被合并')
+        config_list = [(name, dest_cls, dest_cls._get_fields_layout()) for name, dest_cls in iter_module_config_classes(dest_m)]
+        if is_summary:
+            return self._render_final_config_summary(dest_m, config_list)
+        return '\n'.join(f'{dest_m.__name__}.{name} 的最终融合配置: {dest_cls().get_pwd_enc_json()}'
+                         for name, dest_cls, _ in config_list)
 
+    def _prepare_merge_from_process_cache(self) -> typing.Optional[tuple]:
+        """子进程读取主进程写的合并配置缓存，不执行用户配置模块。缓存不存在或已失效时返回 None"""
+        from nb_config import merged_config_cache
+        token = merged_config_cache.get_process_cache_token(is_main=False)
+        if token is None:  # 不是由开启了缓存的主进程启动的
+            return None
+        if self.user_config_file_format is not None:
+            user_file = self.get_user_config_file()
+        else:
+            from nb_config.literal_config_source import find_module_spec_without_import
+            try:
+                user_spec = find_module_spec_without_import(self.user_config_module_path)  # 只查找文件位置，不执行用户配置模块和它的上级包
+            except ModuleNotFoundError:
+                return None
+            if user_spec is None or not user_spec.has_location:
+                return None
+            user_file = user_spec.origin
+        dest_m = importlib.import_module(self.default_config_module_path)
+        if not dest_m.__file__:
+            return None
+        cache_file = merged_config_cache.get_cache_file(user_file, dest_m.__file__, token, self.process_cache_dir)
+        merged = merged_config_cache.load_merged_config_cache(cache_file, self._get_env_index())
+        if merged is None:
+            return None
+        merged_config_list = []
+        for name, dest_cls in iter_module_config_classes(dest_m):
+            if name not in merged:  # 默认配置模块新增了配置类，缓存不完整
+                return None
+            merged_config_list.append((name, dest_cls, merged[name]))
+        self._pending_applied_keys = {dest_cls: set(values) for _, dest_cls, values in merged_config_list}
+        if self._is_print_import_banner:
+            print(f'''使用 "{cache_file}" 中缓存的 {self.user_config_module_path} 合并配置''')
+        return dest_m, merged_config_list
 
+    def _get_env_index(self) -> dict:
+        if not self.env_prefix:
+            return {}
+        from nb_config.env_overlay import build_env_index
+        return build_env_index(self.env_prefix)
 
+    def _build_merged_config(self, m, dest_m) -> list:
+        """
+        先把所有用户配置类都实例化并和默认配置类当前的值合并好，返回 [(类名, 默认配置类, 要设置的字段值)]。
+        只包含用户配置(和环境变量)写了的配置项，和以前一样叠加在默认配置类当前的值上，不影响别的导入器、@nb_config_class 设置的配置项；
+        重新加载同一个用户配置时，这个导入器上次设置过、这次用户删掉了的配置项恢复成默认值。
+        m 是用户配置模块，或者解析好的 toml/json/yaml 用户配置文件 FileConfigSource ，文件中没有写的配置类使用默认值；
+        静态解析的 python 用户配置模块也是 FileConfigSource ，和执行模块一样，缺少默认配置模块中的配置类时报 AttributeError 。
+        用户配置的值按默认配置类编译好的 schema 校验并转换类型，所有错误汇总成一个 ValueError 。
+        设置了 env_prefix 时，环境变量的值在同一轮合并中覆盖在用户配置之上。
+        这一步不修改任何默认配置类，用户配置代码出错时默认配置类保持原样。
+        """
+        from nb_config.config_schema import coerce_user_values, find_assignment_line
+        from nb_config.env_overlay import get_env_overrides
+        from nb_config.file_config_source import FileConfigSource
+        env_index = self._get_env_index()
+        is_file_source = isinstance(m, FileConfigSource)
+        user_file = m.file_name if is_file_source else getattr(m, '__file__', None)
+        merged_config_list = []
+        pending_applied_keys = {}
+        errors = []
+        for name, dest_cls in iter_module_config_classes(dest_m):
+            default_values = dest_cls._get_default_fields()
+            current_values = dest_cls._get_fields_layout()
+            removed_keys = [k for k in self._applied_keys.get(dest_cls, ()) if k in default_values]
+            current_values = dict(current_values, **{k: default_values[k] for k in removed_keys})
+            if not is_file_source:
+                raw_user_values = getattr(m,name)().get_dict()
+            elif name in m.sections or m.file_format != 'python':
+                raw_user_values = m.sections.get(name, {})
+            else:
+                raise AttributeError(f"module {self.user_config_module_path!r} has no attribute {name!r}")
+            user_values = coerce_user_values(dest_cls, raw_user_values, user_file, name, errors)
+            values = {}
+            for k, v in user_values.items(): # 将用户配置的值更新到默认配置中，嵌套的配置实例按结构深度合并
+                values[k] = merge_config_value(current_values[k], v) if k in current_values else v
+            env_overrides = get_env_overrides(env_index, name, dict(current_values, **values), default_values) if env_index else None
+            if env_overrides:  # 环境变量和用户配置一样按 schema 转换类型，嵌套的配置实例深度合并
+                env_values = coerce_user_values(dest_cls, {k: v for k, (_, v) in env_overrides.items()}, user_file, name,
+                                                errors, env_names={k: env_name for k, (env_name, _) in env_overrides.items()})
+                for k, v in env_values.items():
+                    values[k] = merge_config_value(values[k] if k in values else current_values[k], v)
+            pending_applied_keys[dest_cls] = set(values)
+            for k in removed_keys:
+                values.setdefault(k, default_values[k])
+            merged_config_list.append((name, dest_cls, values))
+        if is_file_source and m.file_format != 'python':
+            known_names = {name for name, _, _ in merged_config_list}
+            for section in m.sections:
+                if section not in known_names:
+                    errors.append(f'"{user_file}:{find_assignment_line(user_file, section, None)}" {section} 不是 '
+                                  f'{dest_m.__name__} 中的配置类')
+        if errors:
+            raise ValueError('用户配置有错误:\n' + '\n'.join(errors))
+        self._pending_applied_keys = pending_applied_keys
+        return merged_config_list
 
+    @staticmethod
+    def _apply_merged_config(merged_config_list: list) -> dict:
+        """把合并好的值设置到默认配置类上，返回变化了的配置项 {默认配置类: {配置名: (旧值, 新值)}}"""
+        diff = {}
+        for name, dest_cls, values in merged_config_list:
+            with dest_cls.config_lock():
+                old_values = dest_cls._get_fields_layout()
+                changed = {k: (old_values.get(k), v) for k, v in values.items()
+                           if k not in old_values or not is_same_config_value(old_values[k], v)}
+                dest_cls.update_cls_attribute(**values)
+                dest_cls.has_merged_config = True
+            if changed:
+                diff[dest_cls] = changed
+        return diff
 
+    def subscribe(self, callback: typing.Callable[[dict], typing.Any]):
+        """
+        注册配置变化的回调函数，每次合并用户配置(包括 watch 检测到文件修改后的重新加载)后，如果有配置项变化，
+        就调用 callback(diff) ， diff 的格式是 {默认配置类: {配置名: (旧值, 新值)}}
+        """
+        self._change_callbacks.append(callback)
+        return callback
 
+    def watch(self, interval: float = 1.0) -> threading.Thread:
+        """
+        启动一个后台线程，每隔 interval 秒检查一次用户配置文件的 mtime ，文件被修改后重新执行一次用户配置模块，
+        并把新的配置合并到默认配置类上，不需要重启进程。用户在文件中删掉的配置项会恢复成三方包的默认值。
+        """
+        if self.user_config_module_path not in _user_module_mtimes:
+            self.auto_import_user_config()
+        self.stop_watch()
+        stop_event = self._watch_stop_event = threading.Event()
+        file_name = self.get_user_config_file()
+
+        def _watch_loop():
+            while not stop_event.wait(interval):
+                try:
+                    mtime = os.stat(file_name).st_mtime_ns
+                except OSError:  # 编辑器保存文件时可能短暂不存在
+                    continue
+                if mtime == _user_module_mtimes.get(self.user_config_module_path):
+                    continue
+                try:
+                    diff = self.overwrite_default_config_with_user_config()
+                except Exception as e:  # 用户配置文件改错了，保留原来的配置，等下次修改
+                    print(f'重新加载 "{file_name}:1" 失败，继续使用原来的配置: {type(e).__name__}: {e}')
+                    _user_module_mtimes[self.user_config_module_path] = mtime
+                    continue
+                print(f'检测到 "{file_name}:1" 被修改，变化的配置项: '
+                      f'{ {f"{cls.__module__}.{cls.__name__}": list(changed) for cls, changed in diff.items()} }')
 
+        thread = threading.Thread(target=_watch_loop, name=f'nb_config_watch_{self.user_config_module_path}', daemon=True)
+        thread.start()
+        return thread
+
+    def stop_watch(self):
+        if self._watch_stop_event is not None:
+            self._watch_stop_event.set()
+            self._watch_stop_event = None
+
+    def check_all_default_config_has_merged(self):
+        dest_m = importlib.import_module(self.default_config_module_path)
+        for name, config_cls in iter_module_config_classes(dest_m):
+            if  config_cls.has_merged_config is False:
+                raise ValueError(f'{dest_m.__name__}.{name} 的配置没有被合并')
+
+
+def batch_auto_import_user_config(module_path_pairs: typing.Iterable[typing.Tuple[str, str]],
+                                  is_show_final_config: bool = False, **importer_kwargs) -> dict:
+    """
+    项目依赖的多个三方包都使用 nb_config 时，一次性导入所有三方包的用户配置。
+    module_path_pairs 是 [(user_config_module_path, default_config_module_path), ...] ，重复的组合和多个三方包共用的模块只导入一次。
+    先执行完所有用户配置模块并算出合并结果，任何一个出错都不会修改默认配置类；然后一轮把合并结果设置到所有默认配置类上，
+    最后只打印一份汇总信息，而不是每个三方包各打印一遍。其他参数和 UserConfigAutoImporter 相同。
+    返回 {(user_config_module_path, default_config_module_path): 变化了的配置项}
+    """
+    importers = []
+    for user_config_module_path, default_config_module_path in dict.fromkeys(tuple(pair) for pair in module_path_pairs):
+        importer = UserConfigAutoImporter(user_config_module_path, default_config_module_path,
+                                          is_show_final_config=is_show_final_config, **importer_kwargs)
+        importer._is_print_import_banner = False
+        importers.append(importer)
+    prepared_list = [importer._prepare_merge_or_create_user_config_file() for importer in importers]
+    diffs = {}
+    for importer, prepared in zip(importers, prepared_list):
+        diffs[(importer.user_config_module_path, importer.default_config_module_path)] = importer._finish_merge(*prepared)
+    if is_main_process():
+        lines = [f'nb_config 批量导入了 {len(importers)} 组用户配置:']
+        for importer, (dest_m, merged_config_list, _) in zip(importers, prepared_list):
+            user_file = importer.get_user_config_file() or importer.user_config_module_path
+            override_count = _count_overridden_keys(merged_config_list)
+            lines.append(f'    "{user_file}:1" -> {dest_m.__name__}  '
+                         f'({len(merged_config_list)} 个配置类, {override_count} 个配置项被覆盖)')
+        print('\n'.join(lines))
+    return diffs
@@ -0,0 +1,170 @@
+"""
+python 用户配置模块的字面量快速路径。
+大多数用户配置模块只是若干个 class X(DataClassBase): 里面写字面量赋值，这种文件用 ast 静态解析就能得到要覆盖的值，
+不需要执行模块、实例化每个配置类再 get_dict() ，也可以在不允许执行用户代码的监控/管理进程中加载。
+只要出现任何不能静态确定的写法(非字面量的值、其他 import 、装饰器、继承别的类、方法定义、模块顶层的其他语句)，
+就判定为不是纯字面量的配置模块，由调用方退回到真正的 import 。
+
+解析结果按 (文件路径, mtime_ns, 文件大小) 缓存在进程内，不小于 16KB 的文件还按内容的 sha1 缓存到磁盘，
+文件内容不变时后续进程启动只需要读文件算 sha1 ，不用再 ast 解析。不是纯字面量的结论也会被缓存。
+"""
+import ast
+import os
+import sys
+import typing
+
+from nb_config.simple_data_class import _is_field_name
+from nb_config.file_config_source import FileConfigSource
+
+_DISK_CACHE_MIN_SIZE = 16 * 1024  # 小于这个大小的文件直接 ast 解析，比读写缓存文件更快
+_NOT_LITERAL = False  # 缓存中表示 "不是纯字面量的配置模块" ，和表示缓存未命中的 None 区分开
+_ALLOWED_IMPORT_MODULES = ('nb_config', '__future__')
+
+_literal_cache = {}  # 文件路径 -> (mtime_ns, 文件大小, sections 或 _NOT_LITERAL)
+
+
+class NotLiteralConfigError(ValueError):
+    """用户配置模块不是纯字面量的，不能静态解析"""
+
+
+def _is_data_class_base(node) -> bool:
+    return (isinstance(node, ast.Name) and node.id == 'DataClassBase') or \
+           (isinstance(node, ast.Attribute) and node.attr == 'DataClassBase')
+
+
+def _is_docstring(stmt) -> bool:
+    if not isinstance(stmt, ast.Expr):
+        return False
+    if sys.version_info < (3, 8):  # 3.8 之前字符串字面量解析成 ast.Str 而不是 ast.Constant
+        return isinstance(stmt.value, ast.Str)
+    return isinstance(stmt.value, ast.Constant) and isinstance(stmt.value.value, str)
+
+
+def _parse_class_body(cls_node: ast.ClassDef) -> typing.Optional[dict]:
+    if cls_node.decorator_list or cls_node.keywords or not cls_node.bases \
+            or not all(_is_data_class_base(base) for base in cls_node.bases):
+        return None
+    values = {}
+    for stmt in cls_node.body:
+        if isinstance(stmt, ast.Pass) or _is_docstring(stmt):
+            continue
+        if isinstance(stmt, ast.Assign):
+            targets, value_node = stmt.targets, stmt.value
+        elif isinstance(stmt, ast.AnnAssign) and stmt.simple:
+            if stmt.value is None:  # 只有类型注解没有值，不会产生类属性
+                continue
+            targets, value_node = [stmt.target], stmt.value
+        else:
+            return None
+        if not all(isinstance(t, ast.Name) for t in targets):
+            return None
+        try:
+            value = ast.literal_eval(value_node)
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            return None
+        for t in targets:
+            if _is_field_name(t.id):
+                values[t.id] = value
+    return values
+
+
+def parse_literal_sections(source: typing.Union[str, bytes], file_name: str = '<unknown>') -> typing.Optional[dict]:
+    """
+    静态解析用户配置模块的源码，返回 {配置类名: {配置名: 值}} ；只要有不能静态确定的写法就返回 None 。
+    源码有语法错误时返回 None ，由真正的 import 报出带行号的 SyntaxError 。
+    """
+    try:
+        tree = ast.parse(source, file_name)
+    except (SyntaxError, ValueError):
+        return None
+    sections = {}
+    for i, stmt in enumerate(tree.body):
+        if isinstance(stmt, ast.ClassDef):
+            values = _parse_class_body(stmt)
+            if values is None:
+                return None
+            sections[stmt.name] = values
+        elif isinstance(stmt, ast.ImportFrom):
+            if stmt.level or (stmt.module or '').split('.')[0] not in _ALLOWED_IMPORT_MODULES:
+                return None
+        elif isinstance(stmt, ast.Import):
+            if any(alias.name.split('.')[0] not in _ALLOWED_IMPORT_MODULES for alias in stmt.names):
+                return None
+        elif not (isinstance(stmt, ast.Pass) or (i == 0 and _is_docstring(stmt))):
+            return None
+    return sections
+
+
+def _find_spec_with_meta_path(name: str, search_locations):
+    for finder in sys.meta_path:
+        find_spec = getattr(finder, 'find_spec', None)
+        if find_spec is not None:
+            spec = find_spec(name, search_locations)
+            if spec is not None:
+                return spec
+    return None
+
+
+def find_module_spec_without_import(module_path: str):
+    """
+    用 sys.meta_path 中的查找器(PathFinder 和 editable 安装等自定义的查找器)一级一级地在 sys.path 和上级包的 __path__ 中查找模块，
+    只查找 spec ，不导入任何模块(包括上级包的 __init__.py)。
+    importlib.util.find_spec 会先导入所有上级包，不能用在不允许执行用户代码的场景。
+    已经导入的上级包使用它的 __path__ ，和真正 import 时查找的位置一致。找不到时和 import 一样抛出 ModuleNotFoundError 。
+    """
+    search_locations = None  # None 表示在 sys.path 中查找顶层模块
+    parts = module_path.split('.')
+    spec = None
+    for i in range(len(parts)):
+        name = '.'.join(parts[:i + 1])
+        if i > 0 and search_locations is None:
+            raise ModuleNotFoundError(f'No module named {name!r}; {parts[i - 1]!r} is not a package', name=name)
+        module = sys.modules.get(name)
+        if module is not None and i < len(parts) - 1:
+            search_locations = getattr(module, '__path__', None)
+            continue
+        spec = _find_spec_with_meta_path(name, search_locations)
+        if spec is None:
+            raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+        search_locations = spec.submodule_search_locations
+    return spec
+
+
+def find_user_config_module_file(module_path: str) -> str:
+    """只查找用户配置模块的源码文件，不执行它和它的上级包，找不到时和 import 一样抛出 ModuleNotFoundError"""
+    spec = find_module_spec_without_import(module_path)
+    if not spec.has_location or not (spec.origin or '').endswith('.py'):
+        raise NotLiteralConfigError(f'{module_path} 不是 .py 源码文件，不能静态解析: {spec.origin}')
+    return spec.origin
+
+
+def load_literal_config_source(module_path: str, cache_dir=None) -> FileConfigSource:
+    """
+    静态解析用户配置模块，返回 file_format 为 'python' 的 FileConfigSource 。
+    模块不是纯字面量的时抛出 NotLiteralConfigError 。cache_dir 为 None 时使用和跨进程合并配置缓存相同的目录。
+    """
+    file_name = find_user_config_module_file(module_path)
+    with open(file_name, 'rb') as f:
+        st = os.fstat(f.fileno())
+        cached = _literal_cache.get(file_name)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            sections = cached[2]
+        else:
+            data = f.read()
+            sections = None
+            if st.st_size >= _DISK_CACHE_MIN_SIZE:
+                import hashlib
+                from nb_config import file_config_source
+                digest = hashlib.sha1(data).hexdigest()
+                cache_file = file_config_source._get_parse_cache_file(file_name, cache_dir)
+                sections = file_config_source._load_parse_cache(cache_file, digest)
+            if sections is None:
+                sections = parse_literal_sections(data, file_name)
+                if sections is None:
+                    sections = _NOT_LITERAL
+                if st.st_size >= _DISK_CACHE_MIN_SIZE:
+                    file_config_source._write_parse_cache(cache_file, digest, sections)
+            _literal_cache[file_name] = (st.st_mtime_ns, st.st_size, sections)
+    if sections is _NOT_LITERAL:
+        raise NotLiteralConfigError(f'"{file_name}:1" 不是只有字面量赋值的配置模块，需要执行模块代码')
+    return FileConfigSource(file_name, 'python', st.st_mtime_ns, sections)
@@ -0,0 +1,82 @@
+"""
+合并用户配置的耗时报告。
+UserConfigAutoImporter 开启 is_profile_merge (或者设置了 merge_report_hook / merge_report_logger) 时，
+每次合并都记录各阶段的耗时和计数，用来排查服务启动慢到底慢在执行用户配置模块、合并、还是打印最终配置。
+没开启时不创建报告对象，合并流程中只多一次 is None 判断。
+"""
+import time
+import typing
+
+PHASE_DESCS = {
+    'read_process_cache': '读取跨进程合并配置缓存',
+    'import_user_config': '执行用户配置模块/解析用户配置文件',
+    'import_default_config': '导入默认配置模块',
+    'build_merged_config': '实例化用户配置类并和默认值合并',
+    'write_process_cache': '写跨进程合并配置缓存',
+    'apply_merged_config': '设置到默认配置类',
+    'print_final_config': '生成并打印最终配置',
+    'callbacks': '执行订阅的回调函数',
+}
+
+
+class MergeReport:
+    """
+    一次合并的报告。phases 是 {阶段名: 秒} ，按执行顺序排列，阶段名的含义见 PHASE_DESCS 。
+    计数: class_count 合并的配置类个数，override_count 和三方包默认值不同的配置项个数，
+    changed_count 这次合并实际变化的配置项个数，printed_bytes 打印最终配置的字节数。
+    """
+    __slots__ = ('user_config', 'default_config_module_path', 'is_from_process_cache', 'phases',
+                 'class_count', 'override_count', 'changed_count', 'printed_bytes', '_last_time')
+
+    def __init__(self, user_config: str, default_config_module_path: str):
+        self.user_config = user_config
+        self.default_config_module_path = default_config_module_path
+        self.is_from_process_cache = False
+        self.phases = {}
+        self.class_count = 0
+        self.override_count = 0
+        self.changed_count = 0
+        self.printed_bytes = 0
+        self._last_time = time.perf_counter()
+
+    def mark(self, phase: str):
+        """记录从上一次 mark (或 resume) 到现在的耗时，算在 phase 阶段上"""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last_time
+        self._last_time = now
+
+    def resume(self):
+        """两个阶段之间等待调度的时间(例如在线程池中准备好后等事件循环)不算到下一个阶段"""
+        self._last_time = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    def as_dict(self) -> dict:
+        return {'user_config': self.user_config, 'default_config_module_path': self.default_config_module_path,
+                'is_from_process_cache': self.is_from_process_cache,
+                'phases': dict(self.phases), 'total': self.total,
+                'class_count': self.class_count, 'override_count': self.override_count,
+                'changed_count': self.changed_count, 'printed_bytes': self.printed_bytes}
+
+    def __str__(self):
+        phases = ', '.join(f'{phase} {cost * 1000:.2f}ms' for phase, cost in self.phases.items())
+        return (f'nb_config 合并 {self.user_config} -> {self.default_config_module_path} 耗时 {self.total * 1000:.2f}ms '
+                f'({phases}); {self.class_count} 个配置类, {self.override_count} 个配置项被覆盖, '
+                f'{self.changed_count} 个配置项变化, 打印 {self.printed_bytes} 字节')
+
+    def __repr__(self):
+        return f'<MergeReport {self.as_dict()}>'
+
+
+def emit_merge_report(report: MergeReport, hook: typing.Optional[typing.Callable[[MergeReport], typing.Any]],
+                      logger):
+    """把报告交给 hook 回调，并且作为一条 INFO 日志记录发给 logger ，报告的字典在日志记录的 nb_config_merge_report 属性中"""
+    if hook is not None:
+        hook(report)
+    if logger is not None:
+        import logging  # 只有设置了 merge_report_logger 才用到
+        if isinstance(logger, str):
+            logger = logging.getLogger(logger)
+        logger.info('%s', report, extra={'nb_config_merge_report': report.as_dict()})
@@ -0,0 +1,173 @@
+"""
+跨进程的合并配置缓存。
+主进程合并完用户配置后，把所有配置类合并后的值写到一个缓存文件，spawn 方式启动的子进程只需要读一次这个文件就能得到最终配置，
+不用再执行用户配置模块。用户配置文件和默认配置文件的 mtime/大小/sha1 或者环境变量覆盖层变化后，缓存自动失效。
+缓存只属于写它的那一次主进程运行: 主进程生成一个运行令牌放到环境变量中，子进程继承这个环境变量，按令牌找到同一次运行的缓存文件，
+同一个项目的另一次运行(例如环境变量不同)不会读到这次运行的缓存。
+"""
+import getpass
+import hashlib
+import os
+import pickle
+import re
+import secrets
+import stat
+import tempfile
+import typing
+from pathlib import Path
+
+_CACHE_FORMAT_VERSION = 1
+PROCESS_CACHE_TOKEN_ENV = 'NB_CONFIG_PROCESS_CACHE_TOKEN'
+_TOKEN_PATTERN = re.compile(r'(\d+)-[0-9a-f]{16}')
+
+_process_cache_token = None  # 当前主进程这次运行的令牌，一个进程内只生成一次
+
+
+def get_default_cache_dir() -> Path:
+    # 每个系统用户单独一个目录，并且只有自己可读写，避免别人篡改缓存文件
+    return Path(tempfile.gettempdir()) / f'nb_config_cache_{getpass.getuser()}'
+
+
+def is_private_cache_dir(cache_dir: Path, is_create: bool = False) -> bool:
+    """
+    缓存文件会被反序列化，只有缓存目录是当前用户自己的、不是符号链接、并且组和其他用户没有任何权限时才读写缓存。
+    mkdir(mode=0o700, exist_ok=True) 不会检查已经存在的目录，别人可以在共享的临时文件夹中抢先创建同名目录放入恶意缓存文件。
+    """
+    try:
+        if is_create:
+            cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        st = os.lstat(cache_dir)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(st.st_mode):
+        return False
+    if hasattr(os, 'getuid') and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+        print(f'缓存目录 {cache_dir} 不属于当前用户或者其他用户有访问权限，不使用缓存')
+        return False
+    return True
+
+
+def get_process_cache_token(is_main: bool) -> typing.Optional[str]:
+    """
+    主进程第一次调用时生成 "主进程pid-随机数" 形式的令牌并写到环境变量 NB_CONFIG_PROCESS_CACHE_TOKEN ，
+    即使从另一个主进程继承了这个环境变量也会重新生成。子进程从环境变量读取令牌，没有令牌或者格式不对时返回 None ，不使用缓存。
+    """
+    global _process_cache_token
+    if not is_main:
+        token = os.environ.get(PROCESS_CACHE_TOKEN_ENV, '')
+        return token if _TOKEN_PATTERN.fullmatch(token) else None
+    if _process_cache_token is None:
+        _process_cache_token = f'{os.getpid()}-{secrets.token_hex(8)}'
+    os.environ[PROCESS_CACHE_TOKEN_ENV] = _process_cache_token
+    return _process_cache_token
+
+
+def _get_sources_key(user_config_file: str, default_config_file: str) -> str:
+    key = hashlib.sha1(f'{os.path.abspath(user_config_file)}|{os.path.abspath(default_config_file)}'.encode()).hexdigest()
+    return f'{Path(user_config_file).stem}__{key[:16]}'
+
+
+def get_cache_file(user_config_file: str, default_config_file: str, token: str, cache_dir=None) -> Path:
+    """
+    缓存文件名由用户配置文件和默认配置文件的绝对路径以及主进程的运行令牌决定，
+    不同项目即使模块 import 路径相同也不会串用缓存，同一个项目的不同次运行也不会串用缓存。
+    """
+    cache_dir = Path(cache_dir) if cache_dir else get_default_cache_dir()
+    return cache_dir / f'{_get_sources_key(user_config_file, default_config_file)}__{token}.pickle'
+
+
+def _is_pid_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:  # 没有权限给这个进程发信号，说明进程还在
+        return True
+    return True
+
+
+def remove_stale_cache_files(cache_file: Path):
+    """删除同一个项目以前的运行留下的缓存文件，主进程还在运行的缓存保留。只在 posix 上清理，windows 的 os.kill 会结束进程"""
+    if os.name != 'posix':
+        return
+    sources_key = cache_file.name.rsplit('__', 1)[0]
+    for other in cache_file.parent.glob(f'{sources_key}__*.pickle'):
+        match = _TOKEN_PATTERN.fullmatch(other.name.rsplit('__', 1)[1][:-len('.pickle')])
+        if other != cache_file and match and not _is_pid_running(int(match.group(1))):
+            try:
+                other.unlink()
+            except OSError:
+                pass
+
+
+def _file_sha1(file_name: str) -> str:
+    with open(file_name, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def get_source_fingerprints(file_names: typing.Iterable[str]) -> list:
+    fingerprints = []
+    for file_name in file_names:
+        st = os.stat(file_name)
+        fingerprints.append((file_name, st.st_mtime_ns, st.st_size, _file_sha1(file_name)))
+    return fingerprints
+
+
+def _is_sources_unchanged(fingerprints: list) -> bool:
+    for file_name, mtime_ns, size, sha1 in fingerprints:
+        try:
+            st = os.stat(file_name)
+        except OSError:
+            return False
+        if st.st_size != size:
+            return False
+        if st.st_mtime_ns != mtime_ns and _file_sha1(file_name) != sha1:  # 只是 touch 了一下内容没变，缓存仍然有效
+            return False
+    return True
+
+
+def write_merged_config_cache(cache_file: Path, source_files: typing.Iterable[str], env_index: dict, merged: dict):
+    """
+    merged 的格式是 {配置类名: 合并后的字段值}。值不能被 pickle 时放弃写缓存，子进程会回退到正常导入用户配置。
+    写入是原子的，子进程读到的要么是旧缓存要么是完整的新缓存。
+    """
+    try:
+        data = pickle.dumps({'version': _CACHE_FORMAT_VERSION,
+                             'sources': get_source_fingerprints(source_files),
+                             'env_index': env_index,
+                             'merged': merged}, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        print(f'合并后的配置不能被 pickle ，不写入跨进程缓存 {cache_file} : {type(e).__name__}: {e}')
+        return False
+    return atomic_write_bytes(cache_file, data)
+
+
+def atomic_write_bytes(cache_file: Path, data: bytes) -> bool:
+    """先写临时文件再 os.replace ，读的一方要么读到旧文件要么读到完整的新文件。缓存目录不安全时不写，返回 False"""
+    if not is_private_cache_dir(cache_file.parent, is_create=True):
+        return False
+    fd, tmp_name = tempfile.mkstemp(dir=str(cache_file.parent), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_name, str(cache_file))
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return True
+
+
+def load_merged_config_cache(cache_file: Path, env_index: dict) -> typing.Optional[dict]:
+    """读取缓存，缓存不存在、已经失效或者缓存目录不安全时返回 None"""
+    if not is_private_cache_dir(cache_file.parent):
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            data = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(data, dict) or data.get('version') != _CACHE_FORMAT_VERSION:
+        return None
+    if data['env_index'] != env_index or not _is_sources_unchanged(data['sources']):
+        return None
+    return data['merged']
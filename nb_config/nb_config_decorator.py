@@ -1,71 +1,102 @@
-# """
-# nb_config 装饰器模块
-# 提供透明的第三方库配置覆盖功能
-# """
-
-# from functools import wraps
-# import importlib
-# import nb_log
-
-# logger = nb_log.get_logger(__name__)
-
-
-# def nb_config_class(overwrite_config_module: str):
-    
-#     """
-#     配置覆盖装饰器
-    
-#     通过装饰器的方式，将用户自定义的配置透明地注入到第三方库的配置类中。
-#     第三方库无需任何修改，自动使用用户的配置值。
-    
-#     Args:
-#         overwrite_config_module: 要覆盖的目标配置模块路径，如 'third_party.config'
-        
-#     Returns:
-#         装饰器函数
-        
-#     Example:
-#         ```python
-#         # third_party_lib/config.py
-#         from nb_config import DataClassBase
-        
-#         class DatabaseConfig(DataClassBase):
-#             host = 'localhost'
-#             port = 5432
-            
-#         # your_project/my_config.py  
-#         from nb_config import nb_config_class, DataClassBase
-        
-#         @nb_config_class('third_party_lib.config')
-#         class DatabaseConfig(DataClassBase):
-#             host = 'production-db.com'
-#             # port 保持默认值 5432
-#         ```
-#     """
-#     def _nbconfig(cls: type):
-#         # 首先检查是否是自己替换自己（在任何导入和处理之前）
-#         # 检查当前类是否就是要替换的目标类
-#         current_module = cls.__module__
-#         if current_module.endswith(overwrite_config_module):
-#             # print(f"🔄 检测到自引用，跳过配置覆盖: {cls.__name__} (自己替换自己)")
-#             return cls
-            
-#         try:
-#             # 导入目标模块并获取同名配置类
-#             target_module = importlib.import_module(overwrite_config_module)
-#             target_config_class = getattr(target_module, cls.__name__)
-            
-#             # 将用户配置类的属性注入到目标配置类中
-#             for key, value in cls.__dict__.items():
-#                 if not key.startswith('__'):  # 跳过私有属性
-#                     logger.debug(f"配置覆盖: {target_config_class.__module__}.{target_config_class.__name__}.{key} = {value}")
-#                     setattr(target_config_class, key, value)
-                    
-#             return cls  # 直接返回原类，保持用户代码不变
-            
-#         except (ImportError, AttributeError) as e:
-#             logger.error(f"配置覆盖失败: {e}")
-#             # 如果目标模块或类不存在，仍然返回原类，避免中断用户程序
-#             return cls
-            
-#     return _nbconfig 
\ No newline at end of file
+"""
+nb_config 装饰器模块
+提供透明的第三方库配置覆盖功能
+
+用户配置类定义时只把要覆盖的值登记下来，目标配置模块已经导入就立即覆盖，还没导入时在它第一次被导入后立刻覆盖，
+所以用户配置模块可以比三方包先导入。覆盖只涉及被装饰的配置类，不需要 UserConfigAutoImporter 扫描整个默认配置模块。
+"""
+import sys
+import warnings
+
+from nb_config.simple_data_class import DataClassBase, _is_field_name, _unwrap_field_value, merge_config_value
+
+
+def _apply_class_override(user_cls: type, values: dict, target_module):
+    """把用户配置类登记的值合并到目标模块中的同名配置类上"""
+    name = user_cls.__name__
+    target_cls = target_module.__dict__.get(name)
+    if not isinstance(target_cls, type):
+        raise AttributeError(f'{target_module.__name__} 中没有 {name} 配置类，'
+                             f'{user_cls.__module__}.{user_cls.__qualname__} 的 @nb_config_class 找不到覆盖目标')
+    if not issubclass(target_cls, DataClassBase):
+        for k, v in values.items():
+            setattr(target_cls, k, v)
+        return
+    from nb_config.config_schema import coerce_user_values
+    errors = []
+    user_file = getattr(sys.modules.get(user_cls.__module__), '__file__', None)
+    values = coerce_user_values(target_cls, values, user_file, name, errors)
+    if errors:
+        raise ValueError('用户配置有错误:\n' + '\n'.join(errors))
+    with target_cls.config_lock():
+        target_cls._get_default_fields()  # 覆盖之前先记住三方包的默认值
+        layout = target_cls._get_fields_layout()
+        target_cls.update_cls_attribute(**{k: merge_config_value(layout[k], v) if k in layout else v
+                                           for k, v in values.items()})
+        target_cls.has_merged_config = True
+
+
+def _is_module_found(module_path: str) -> bool:
+    """
+    只查找模块文件，不导入目标模块和它的上级包。importlib.util.find_spec 会导入上级包，
+    上级包的 __init__.py 经常会导入配置模块，那样用户配置比三方包先导入时也变成了立即覆盖。
+    """
+    from nb_config.literal_config_source import find_module_spec_without_import
+    try:
+        find_module_spec_without_import(module_path)
+    except ModuleNotFoundError:
+        return False
+    return True
+
+
+def nb_config_class(overwrite_config_module: str):
+    """
+    配置覆盖装饰器
+
+    通过装饰器的方式，将用户自定义的配置透明地注入到第三方库的配置类中。
+    第三方库无需任何修改，自动使用用户的配置值。
+
+    Args:
+        overwrite_config_module: 要覆盖的目标配置模块路径，如 'third_party.config'
+
+    Returns:
+        装饰器函数
+
+    Raises:
+        ImportError: 目标配置模块不存在(不是 ModuleNotFoundError ，导入用户配置时不会被误认为用户配置模块不存在而自动创建)
+        AttributeError: 目标配置模块中没有同名的配置类，在目标模块导入时抛出
+        ValueError: 用户配置的值类型不对
+
+    Example:
+        ```python
+        # third_party_lib/config.py
+        from nb_config import DataClassBase
+
+        class DatabaseConfig(DataClassBase):
+            host = 'localhost'
+            port = 5432
+
+        # your_project/my_config.py
+        from nb_config import nb_config_class, DataClassBase
+
+        @nb_config_class('third_party_lib.config')
+        class DatabaseConfig(DataClassBase):
+            host = 'production-db.com'
+            # port 保持默认值 5432
+        ```
+    """
+    def _nb_config(cls: type):
+        if cls.__module__ == overwrite_config_module:
+            warnings.warn(f'{cls.__module__}.{cls.__qualname__} 的 @nb_config_class 目标是它自己所在的模块，不会覆盖任何配置',
+                          stacklevel=2)
+            return cls
+        if sys.modules.get(overwrite_config_module) is None and not _is_module_found(overwrite_config_module):
+            raise ImportError(f'@nb_config_class 的目标配置模块 {overwrite_config_module} 不存在 '
+                              f'({cls.__module__}.{cls.__qualname__})', name=overwrite_config_module)
+        from nb_config.import_hook import register_post_import_hook
+        values = {k: _unwrap_field_value(v) for k, v in cls.__dict__.items() if _is_field_name(k)}
+        register_post_import_hook(overwrite_config_module,
+                                  lambda target_module: _apply_class_override(cls, values, target_module))
+        return cls  # 直接返回原类，保持用户代码不变
+
+    return _nb_config
@@ -1,12 +1,47 @@
+import functools
+import itertools
 import json
-
-import copy
+import math
+import re
+import sys
+import threading
 import typing
+import weakref
+
+
+_orjson = None
+_orjson_checked = False
+
+
+def _get_orjson():
+    """安装了 orjson 返回 orjson 模块，没安装返回 None 使用标准库 json"""
+    global _orjson, _orjson_checked
+    if not _orjson_checked:
+        try:
+            import orjson
+            _orjson = orjson
+        except ImportError:
+            pass
+        _orjson_checked = True
+    return _orjson
 
 
-from nb_libs.str_utils import PwdEnc, StrHelper
+def _has_non_finite_float(v) -> bool:
+    if isinstance(v, float):
+        return not math.isfinite(v)
+    if isinstance(v, dict):
+        return any(_has_non_finite_float(x) for x in v.values())
+    if isinstance(v, (list, tuple)):
+        return any(_has_non_finite_float(x) for x in v)
+    return False
 
-def dict_to_un_strict_json(dictx: dict, indent=4):
+
+def dict_to_un_strict_json(dictx: dict, indent=4, is_use_orjson=False):
+    """
+    indent 为 None 时输出没有缩进和空格的紧凑 json 。
+    is_use_orjson 为True并且安装了 orjson 时用 orjson 序列化，orjson 只支持缩进2或者不缩进，其他缩进使用标准库 json ；
+    orjson 把 nan/inf 输出成 null ，含有这些值时也使用标准库 json 。
+    """
     dict_new = {}
     for k, v in dictx.items():
         # only_print_on_main_process(f'{k} :  {v}')
@@ -14,30 +49,456 @@ def dict_to_un_strict_json(dictx: dict, indent=4):
             dict_new[k] = v
         else:
             dict_new[k] = str(v)
-    return json.dumps(dict_new, ensure_ascii=False, indent=indent)
-    
-class DataClassBase:
+    if is_use_orjson and (indent is None or indent == 2):
+        orjson = _get_orjson()
+        if orjson is not None:
+            try:
+                if not _has_non_finite_float(dict_new):
+                    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+                    return orjson.dumps(dict_new, option=option).decode('utf-8')
+            except TypeError:  # orjson 不支持的类型(例如超过64位的整数)，交给标准库 json 处理
+                pass
+    separators = (',', ':') if indent is None else None
+    return json.dumps(dict_new, ensure_ascii=False, indent=indent, separators=separators)
+
+
+
+_enc_pwd_value_cache = {}  # (配置值字符串, 是否是密码配置) -> 打码后的字符串
+_ENC_PWD_VALUE_CACHE_MAX_SIZE = 4096
+
+
+def _enc_pwd_value(value: str, is_pwd_key: bool) -> str:
+    """对配置值打码，结果按值缓存，启动时和每次重新加载时打印几十个配置类不会重复计算"""
+    cache_key = (value, is_pwd_key)
+    v_enc = _enc_pwd_value_cache.get(cache_key)
+    if v_enc is None:
+        from nb_libs.str_utils import PwdEnc  # 只有打印配置时才用到，延迟导入加快 import nb_config
+        v_enc = PwdEnc.enc_broker_uri(value)
+        if is_pwd_key:
+            v_enc = PwdEnc.enc_pwd(v_enc)
+        if len(_enc_pwd_value_cache) >= _ENC_PWD_VALUE_CACHE_MAX_SIZE:
+            _enc_pwd_value_cache.clear()
+        _enc_pwd_value_cache[cache_key] = v_enc
+    return v_enc
+
+
+_version_counter = itertools.count(1)  # 所有配置类共用一个全局递增计数器，保证每个类的版本号单调递增
+
+
+def is_same_config_value(old, new) -> bool:
+    """类型相同且相等才算配置没变，例如 1 改成 True 也算变化。嵌套的配置实例没有 __eq__ ，按字段逐个比较"""
+    if old is new:
+        return True
+    if isinstance(old, DataClassBase):
+        if type(old) is not type(new):
+            return False
+        old_values, new_values = old._get_field_values(), new._get_field_values()
+        return old_values.keys() == new_values.keys() and \
+            all(is_same_config_value(v, new_values[k]) for k, v in old_values.items())
+    try:
+        return type(old) is type(new) and bool(old == new)
+    except Exception:  # 例如 numpy 数组比较结果不能转换成 bool
+        return False
+
+
+def cached_by_config_version(*config_classes: typing.Type['DataClassBase']):
+    """
+    按配置版本缓存函数结果的装饰器，适合根据配置创建客户端、连接池等资源。
+    只有 config_classes 中某个配置类的版本号变了(配置真的变化了)，才重新调用被装饰的函数，否则直接返回上次的结果。
+    不同的参数分别缓存。
+
+    Example:
+        @cached_by_config_version(RedisConfig)
+        def get_redis_client():
+            return redis.Redis(host=RedisConfig.host, port=RedisConfig.port)
+    """
+    def _decorator(fun):
+        cache = {}  # 参数 -> (版本号元组, 结果)
+        lock = threading.Lock()
+
+        @functools.wraps(fun)
+        def _wrapper(*args, **kwargs):
+            versions = tuple(config_cls.get_version() for config_cls in config_classes)
+            key = (args, tuple(kwargs.items()))
+            cached = cache.get(key)
+            if cached is not None and cached[0] == versions:
+                return cached[1]
+            with lock:
+                cached = cache.get(key)
+                if cached is not None and cached[0] == versions:
+                    return cached[1]
+                result = fun(*args, **kwargs)
+                cache[key] = (versions, result)
+                return result
+
+        _wrapper.cache_clear = cache.clear
+        return _wrapper
+
+    return _decorator
+
+
+def merge_config_value(base, override):
+    """
+    深度合并配置值。base 是嵌套的配置实例并且 override 是字典(或配置实例)时，逐个叶子合并，返回新的配置实例，
+    没有变化的子树直接复用原来的对象(结构共享)，整个子树都没变化时返回 base 本身。其他情况 override 直接替换 base 。
+    """
+    if not isinstance(base, DataClassBase) or not isinstance(override, (dict, DataClassBase)):
+        return override
+    if isinstance(override, DataClassBase):
+        override = override._get_field_values()
+    base_values = base._get_field_values()
+    changed = {}
+    for k, v in override.items():
+        if k in base_values:
+            old = base_values[k]
+            new = merge_config_value(old, v)
+            if is_same_config_value(old, new):
+                continue
+        else:
+            new = v
+        changed[k] = new
+    if not changed:
+        return base
+    values = dict(base_values)
+    values.update(changed)
+    return type(base)._from_fields(values)
+
+
+def _is_field_name(name: str) -> bool:
+    return not name.startswith('__') and name != 'has_merged_config'
+
+
+class ConfigNotMergedError(ValueError, AttributeError):
+    """
+    严格模式的配置类在合并用户配置之前被读取。同时是 AttributeError ，
+    hasattr()、getattr(obj, name, default)、inspect.getmembers() 这些探测属性的代码把它当成属性不存在，而不是异常退出。
+    """
+
+
+def _raise_not_merged(cls, name: str = None):
+    field = f'{cls.__name__}.{name}' if name else cls.__name__
+    raise ConfigNotMergedError(f'{field} 的配置没有被合并，请先调用 UserConfigAutoImporter(...).auto_import_user_config() 再读取配置')
+
+
+class _UnmergedField:
+    """
+    严格模式(__strict_merge__ = True)的配置类在合并用户配置之前，每个配置字段都被替换成这个描述符，读取类属性直接报错。
+    合并之前创建的实例只在 __dict__ 中记录传入的字段，其他字段落到这个描述符上读取，同样报错。
+    合并完成后描述符被换回普通的类属性，之后读取配置没有任何额外开销。
+    """
+    __slots__ = ('name', 'value')
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def __get__(self, instance, owner):
+        _raise_not_merged(owner, self.name)
+
+
+class _OverlayField:
+    """
+    有 override() 作用域正在使用的配置字段被替换成这个描述符，读取类属性时先查当前上下文的覆盖层，没有覆盖再返回合并后的值。
+    读取的开销只有一次 ContextVar.get() 和一次字典查找；所有作用域都退出后描述符被换回普通的类属性，不再有额外开销。
+    """
+    __slots__ = ('name', 'value', 'overlay_var')
+
+    def __init__(self, name, value, overlay_var):
+        self.name = name
+        self.value = value
+        self.overlay_var = overlay_var
+
+    def __get__(self, instance, owner):
+        if instance is not None:  # 作用域外实例化的实例不受覆盖层影响，作用域内实例化的实例覆盖值已经在实例自己的 __dict__ 中
+            return self.value
+        return self.overlay_var.get().get(self.name, self.value)
+
+
+def _unwrap_field_value(v):
+    return v.value if isinstance(v, (_UnmergedField, _OverlayField)) else v
+
+
+def _set_cls_field(cls, name, value):
+    """设置配置字段的值，字段是覆盖层描述符时只替换描述符里合并后的值，描述符保留"""
+    current = cls.__dict__.get(name)
+    if isinstance(current, _OverlayField):
+        current.value = value
+    else:
+        type.__setattr__(cls, name, value)
+
+
+_EMPTY_OVERLAY = {}
+_DELTA_INSTANCE_MIN_FIELDS = 64  # 字段数少于这个数的配置类直接复制字段布局，比加锁登记只记录覆盖字段的实例更快
+
+
+class _ConfigOverride:
+    """ConfigKLS1.override(...) 返回的上下文管理器，嵌套使用时内层的覆盖值叠加在外层之上"""
+    __slots__ = ('config_cls', 'overrides', '_token')
+
+    def __init__(self, config_cls, overrides: dict):
+        self.config_cls = config_cls
+        self.overrides = overrides
+        self._token = None
+
+    def __enter__(self):
+        overlay_var = self.config_cls._install_overlay_fields(self.overrides)
+        try:
+            outer = overlay_var.get()
+            layout = self.config_cls._get_fields_layout()
+            overlay = dict(outer)
+            for k, v in self.overrides.items():
+                overlay[k] = merge_config_value(outer[k] if k in outer else layout[k], v)
+            self._token = overlay_var.set(overlay)
+        except BaseException:
+            self.config_cls._uninstall_overlay_fields()
+            raise
+        return self.config_cls
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.config_cls.__nb_overlay_var__.reset(self._token)
+        self._token = None
+        self.config_cls._uninstall_overlay_fields()
+
+
+class DataClassMeta(type):
+    """
+    DataClassBase 的元类，类属性被修改(不管是 update_cls_attribute 还是直接 ConfigKLS1.x = 1)时，
+    自动让该类缓存的字段布局失效，下次实例化时重新生成。
+    """
+
+    def __setattr__(cls, name, value):
+        if _is_field_name(name):
+            with cls.__nb_lock__:
+                cls._materialize_delta_instances()
+                _set_cls_field(cls, name, value)
+                cls._invalidate_fields_layout()
+        elif name == 'has_merged_config' and value is True:
+            with cls.__nb_lock__:
+                super().__setattr__(name, value)
+                cls._remove_unmerged_guards()
+        else:
+            super().__setattr__(name, value)
+
+    def __delattr__(cls, name):
+        if _is_field_name(name):
+            with cls.__nb_lock__:
+                cls._materialize_delta_instances()
+                super().__delattr__(name)
+                cls._invalidate_fields_layout()
+        else:
+            super().__delattr__(name)
+
+
+class DataClassBase(metaclass=DataClassMeta):
     """
     使用类实现的 简单数据类。
     也可以使用装饰器来实现数据类
     """
+    __slots__ = ('__dict__', '__weakref__', '_nb_src_layout', '_nb_delta_base')
     has_merged_config = False
+    __pwd_key_patterns__ = ('pwd', 'pass_word', 'password', 'passwd', 'pass')  # 配置名包含这些字符串(不区分大小写)的值打印时会打码
+    __strict_merge__ = False  # 为True时，合并用户配置之前读取类的配置字段直接报错，代替在每个函数里调用 check_has_merged_config
+    __use_orjson__ = False  # 为True时安装了 orjson 就用它生成 json ，更快，但浮点数的写法和标准库不同(例如 1e-07 输出成 1e-7)
+    __nb_lock__ = threading.RLock()
+    __nb_overlay_var__ = None  # 第一次调用 override() 时创建的 ContextVar ，值是当前上下文的 {配置名: 覆盖值}
+    __nb_overlay_scope_count__ = 0  # 所有线程/协程中还没退出的 override() 作用域数量，为 0 时类属性和实例化都不查覆盖层
+    __nb_delta_instances__ = None  # 只记录了被覆盖字段的存活实例的弱引用集合，类属性被修改之前把它们补全
+    __nb_unmerged_instances__ = None  # 严格模式的类合并之前创建的存活实例的弱引用集合，合并完成后补全成合并后的值；不是严格模式或者已经合并时为 None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        type.__setattr__(cls, '__nb_lock__', threading.RLock())  # 每个配置类一把锁，修改类属性时持有
+        type.__setattr__(cls, '__nb_overlay_var__', None)  # 子类不继承父类的覆盖层
+        type.__setattr__(cls, '__nb_overlay_scope_count__', 0)
+        type.__setattr__(cls, '__nb_delta_instances__', set())
+        type.__setattr__(cls, '__nb_unmerged_instances__', None)
+        if cls.__strict_merge__ and not cls.has_merged_config:
+            for k, v in cls._get_fields_layout().items():
+                type.__setattr__(cls, k, _UnmergedField(k, v))
+            type.__setattr__(cls, '__nb_unmerged_instances__', set())
+
+    @classmethod
+    def _remove_unmerged_guards(cls):
+        """合并完成(持有类的锁): 换回普通类属性，合并之前创建的实例补全成合并后的值，和合并之后创建的实例一样"""
+        for k, v in list(cls.__dict__.items()):
+            if isinstance(v, _UnmergedField):
+                type.__setattr__(cls, k, v.value)
+        instances = cls.__nb_unmerged_instances__
+        if instances is None:
+            return
+        type.__setattr__(cls, '__nb_unmerged_instances__', None)
+        layout = cls._get_fields_layout()
+        for ref in list(instances):
+            instance = ref()
+            if instance is not None:
+                delta = instance.__dict__
+                instance.__dict__ = {**layout, **delta}
+                object.__setattr__(instance, '_nb_delta_base', None)
+                object.__setattr__(instance, '_nb_src_layout', None if delta else layout)
 
     def __new__(cls, **kwargs):
+        """
+        字段多的配置类的实例只在 __dict__ 中记录被覆盖(实例化时传入或者之后修改)的字段，其他字段直接落到类属性上读取，
+        不需要为了改一个字段复制全部字段。类属性被修改之前，这些实例会先补全成完整的 __dict__ ，所以实例的值仍然是实例化时的配置。
+        """
         self = super().__new__(cls)
-        self.__dict__ = copy.copy({k: v for k, v in cls.__dict__.items() if not k.startswith('__')})
-        self.__dict__.pop('has_merged_config',None)
+        object.__setattr__(self, '_nb_delta_base', None)
+        if cls.__nb_overlay_scope_count__:
+            overlay = cls.__nb_overlay_var__.get()
+            if overlay:  # 在 override() 作用域内实例化，实例也使用覆盖后的值
+                self.__dict__ = {**cls._get_fields_layout(), **overlay}
+                object.__setattr__(self, '_nb_src_layout', None)
+                return self
+        unmerged_instances = cls.__nb_unmerged_instances__
+        if unmerged_instances is not None:  # 严格模式的类还没合并，没有传入的字段读取时由 _UnmergedField 报错
+            with cls.__nb_lock__:
+                if cls.__nb_unmerged_instances__ is not None:
+                    layout = cls._get_fields_layout()
+                    self.__dict__ = {}
+                    object.__setattr__(self, '_nb_delta_base', layout)
+                    object.__setattr__(self, '_nb_src_layout', layout)
+                    unmerged_instances.add(weakref.ref(self, unmerged_instances.discard))
+                    return self
+        layout = cls._get_fields_layout()
+        delta_cached = cls.__dict__.get('__nb_delta_layout__')
+        if delta_cached[1] if delta_cached is not None and delta_cached[0] is layout else cls._is_delta_layout(layout):
+            with cls.__nb_lock__:  # 和修改类属性互斥，登记之后类属性才可能变化
+                if cls.__dict__.get('__nb_fields_layout__') is layout:
+                    self.__dict__ = {}
+                    object.__setattr__(self, '_nb_delta_base', layout)
+                    instances = cls.__nb_delta_instances__
+                    instances.add(weakref.ref(self, instances.discard))  # 实例被回收时弱引用自己从集合中移除，比 WeakSet 开销小
+                else:  # 刚刚有别的线程修改了类属性
+                    layout = cls._get_fields_layout()
+                    self.__dict__ = layout.copy()
+        else:
+            self.__dict__ = layout.copy()
+        # 实例没有被修改过时，记住它是从哪个字段布局复制来的，get_dict/get_json 可以直接使用按类缓存的结果
+        object.__setattr__(self, '_nb_src_layout', layout)
         return self
 
+    @classmethod
+    def _is_delta_layout(cls, layout: dict) -> bool:
+        """
+        字段布局 layout 是否使用只记录被覆盖字段的实例，按字段布局缓存。
+        字段少的类直接复制更快；字段值里有函数、property 这类描述符时，落到类属性上读取会得到绑定后的结果，也直接复制。
+        """
+        cached = cls.__dict__.get('__nb_delta_layout__')
+        if cached is not None and cached[0] is layout:
+            return cached[1]
+        is_delta = len(layout) >= _DELTA_INSTANCE_MIN_FIELDS and not any(hasattr(type(v), '__get__') for v in layout.values())
+        type.__setattr__(cls, '__nb_delta_layout__', (layout, is_delta))
+        return is_delta
+
+    @classmethod
+    def _materialize_delta_instances(cls):
+        """修改类属性之前调用(持有类的锁)，把只记录了被覆盖字段的存活实例补全成完整的 __dict__"""
+        instances = cls.__dict__.get('__nb_delta_instances__')
+        if instances:
+            for ref in list(instances):
+                instance = ref()
+                if instance is not None:
+                    instance._materialize()
+            instances.clear()
+
+    def _materialize(self):
+        base = self._nb_delta_base
+        if base is not None:
+            self.__dict__ = {**base, **self.__dict__}
+            object.__setattr__(self, '_nb_delta_base', None)
+
+    def _get_field_values(self) -> dict:
+        """实例的全部字段 {字段名: 值}，可能是实例的 __dict__ 或者字段布局本身，不要原地修改"""
+        base = self._nb_delta_base
+        if base is None:
+            return self.__dict__
+        delta = self.__dict__
+        return {**base, **delta} if delta else base
+
+    def __getstate__(self):
+        # copy/pickle 得到完整的 __dict__ ，不依赖当前进程中类的字段布局
+        return dict(self._get_field_values()), {'_nb_src_layout': None, '_nb_delta_base': None}
+
+    @classmethod
+    def _get_fields_layout(cls) -> dict:
+        """
+        返回该类自身定义的配置字段 {字段名: 值}，只在第一次使用或者类属性被修改后才扫描一次 cls.__dict__ ，
+        之后实例化只需要浅拷贝这个缓存好的模板字典。返回的字典不要原地修改。
+        """
+        layout = cls.__dict__.get('__nb_fields_layout__')
+        if layout is None:
+            with cls.__nb_lock__:  # 避免扫描 cls.__dict__ 的同时别的线程正在修改类属性
+                layout = cls.__dict__.get('__nb_fields_layout__')
+                if layout is None:
+                    layout = {k: _unwrap_field_value(v) for k, v in cls.__dict__.items() if _is_field_name(k)}
+                    type.__setattr__(cls, '__nb_fields_layout__', layout)
+        return layout
+
+    @classmethod
+    def _invalidate_fields_layout(cls):
+        type.__setattr__(cls, '__nb_fields_layout__', None)
+        type.__setattr__(cls, '__nb_version__', next(_version_counter))
+
+    @classmethod
+    def _publish_fields_layout(cls, layout: dict):
+        type.__setattr__(cls, '__nb_fields_layout__', layout)
+        type.__setattr__(cls, '__nb_version__', next(_version_counter))
+
+    @classmethod
+    def get_version(cls) -> int:
+        """
+        配置版本号，类的配置字段每次变化(update_cls_attribute、合并用户配置、重新加载、直接给类属性赋值)都会变大，
+        使用方只需要比较一个整数就能知道配置是否变了。原地修改可变的配置值或者嵌套配置实例的属性不会改变版本号。
+        """
+        return cls.__dict__.get('__nb_version__', 0)
+
     def __init__(self, **kwargs):
         for k, v in kwargs.items():
             setattr(self, k, v)
 
+    def __setattr__(self, key, value):
+        object.__setattr__(self, '_nb_src_layout', None)
+        object.__setattr__(self, key, value)
+
+    def __delattr__(self, key):
+        self._materialize()  # 删除后读取该属性落到类属性上，和完整 __dict__ 的实例一致
+        object.__setattr__(self, '_nb_src_layout', None)
+        object.__delattr__(self, key)
+
     def __call__(self, ) -> dict:
         return self.get_dict()
 
+    @classmethod
+    def _get_nested_field_names(cls, layout: dict) -> tuple:
+        """字段布局 layout 中值为 DataClassBase 实例的字段名，按字段布局缓存"""
+        cached = cls.__dict__.get('__nb_nested_field_names__')
+        if cached is not None and cached[0] is layout:
+            return cached[1]
+        names = tuple(k for k, v in layout.items() if isinstance(v, DataClassBase))
+        type.__setattr__(cls, '__nb_nested_field_names__', (layout, names))
+        return names
+
+    def _get_serialize_token(self) -> typing.Optional[tuple]:
+        """
+        实例(以及嵌套的配置实例)都没有被修改过时，返回它们来源的字段布局组成的元组，作为序列化结果的缓存键；否则返回 None 。
+        类属性被修改后字段布局会整体替换，所以缓存键自然失效。
+        """
+        layout = self._nb_src_layout
+        if layout is None:
+            return None
+        token = [layout]
+        for k in type(self)._get_nested_field_names(layout):
+            nested_token = layout[k]._get_serialize_token()
+            if nested_token is None:
+                return None
+            token.extend(nested_token)
+        return tuple(token)
+
     def get_dict(self):
-        return {k: v.get_dict() if isinstance(v, DataClassBase) else v for k, v in self.__dict__.items()}
+        values = self._get_field_values()
+        if self._nb_src_layout is not None and not type(self)._get_nested_field_names(self._nb_src_layout):
+            return dict(values)
+        return {k: v.get_dict() if isinstance(v, DataClassBase) else v for k, v in values.items()}
 
     def __str__(self):
         return f"{self.__class__}    {self.get_dict()}"
@@ -46,28 +507,173 @@ class DataClassBase:
         return getattr(self, item)
 
     def get_json(self,indent=4):
-        return dict_to_un_strict_json(self.get_dict(),indent=indent)
+        """
+        实例没有被修改过时，序列化结果按 (类的字段布局, indent) 缓存，类属性被修改后自动失效。
+        注意直接原地修改可变的配置值(例如 ConfigKLS1.some_dict['k'] = 1)不会让缓存失效，请使用 update_cls_attribute 。
+        indent=None 输出紧凑 json 。
+        """
+        return self._get_cached_serialization(
+            ('json', indent), lambda: dict_to_un_strict_json(self.get_dict(), indent=indent, is_use_orjson=self.__use_orjson__))
+
+    def _get_cached_serialization(self, key, build: typing.Callable[[], str]) -> str:
+        token = self._get_serialize_token()
+        if token is None:
+            return build()
+        cls = type(self)
+        cache = cls.__dict__.get('__nb_json_cache__')
+        if cache is None or len(cache[0]) != len(token) or any(a is not b for a, b in zip(cache[0], token)):
+            cache = (token, {})
+            type.__setattr__(cls, '__nb_json_cache__', cache)
+        json_str = cache[1].get(key)
+        if json_str is None:
+            json_str = cache[1][key] = build()
+        return json_str
+
+    @classmethod
+    def _get_pwd_key_flags(cls) -> dict:
+        """
+        {配置名: 是否是密码配置}，按类缓存，每个配置名只用一个预编译的正则判断一次。
+        配置类可以通过 __pwd_key_patterns__ 自定义哪些配置名算密码。
+        """
+        patterns = cls.__pwd_key_patterns__
+        cached = cls.__dict__.get('__nb_pwd_key_flags__')
+        if cached is None or cached[0] is not patterns:
+            regex = re.compile('|'.join(re.escape(p) for p in patterns), re.IGNORECASE) if patterns else None
+            cached = (patterns, regex, {})
+            type.__setattr__(cls, '__nb_pwd_key_flags__', cached)
+        return cached
 
     def get_pwd_enc_json(self,indent=4):
         """防止打印密码明文,泄漏密码"""
+        return self._get_cached_serialization(('pwd_enc_json', indent), lambda: self._build_pwd_enc_json(indent))
+
+    def _build_pwd_enc_json(self, indent):
+        _, regex, flags = type(self)._get_pwd_key_flags()
         dict_new = {}
         for k, v in self.get_dict().items():
             # only_print_on_main_process(f'{k} :  {v}')
             if isinstance(v, (bool, tuple, dict, float, int)):
                 dict_new[k] = v
             else:
-                v_enc =PwdEnc.enc_broker_uri(str(v))
-                if StrHelper(k).judge_contains_str_list(['pwd', 'pass_word', 'password', 'passwd', 'pass']):
-                    v_enc = PwdEnc.enc_pwd(v_enc)
-                dict_new[k] = v_enc
-        return dict_to_un_strict_json(dict_new,  indent=indent)
+                is_pwd_key = flags.get(k)
+                if is_pwd_key is None:
+                    is_pwd_key = flags[k] = bool(regex and regex.search(k))
+                dict_new[k] = _enc_pwd_value(str(v), is_pwd_key)
+        return dict_to_un_strict_json(dict_new,  indent=indent, is_use_orjson=self.__use_orjson__)
 
     @classmethod
     def update_cls_attribute(cls,**kwargs):
-        for k ,v in kwargs.items():
-            setattr(cls,k,v)
+        """
+        批量修改类属性，多个线程同时修改同一个类时按类加锁串行执行。
+        新的字段布局先在旁边生成好(写时复制)，所有属性设置完后一次性替换，
+        所以实例化、freeze()、get_dict() 这些基于字段布局的读取不需要加锁，要么看到全部旧值，要么看到全部新值。
+        直接读取多个类属性又要求它们一致时，读取期间持有 config_lock() 。
+        """
+        with cls.__nb_lock__:
+            old_layout = cls._get_fields_layout()
+            changed = {k: v for k, v in kwargs.items()
+                       if not _is_field_name(k) or k not in old_layout or not is_same_config_value(old_layout[k], v)}
+            if not changed:  # 值都没变，不改变版本号，依赖版本号缓存的资源不用重建
+                return cls
+            cls._materialize_delta_instances()
+            new_layout = dict(old_layout)
+            new_layout.update((k, v) for k, v in changed.items() if _is_field_name(k))
+            for k ,v in changed.items():
+                _set_cls_field(cls, k, v)  # 绕过元类，避免每设置一个属性就让字段布局失效一次
+            cls._publish_fields_layout(new_layout)
         return cls
 
+    @classmethod
+    def config_lock(cls) -> threading.RLock:
+        """
+        配置类的锁，修改类属性时会持有。需要一次读取多个类属性并保证它们来自同一次合并时使用:
+            with ConfigKLS1.config_lock():
+                a, b = ConfigKLS1.config_a, ConfigKLS1.config_b
+        不想加锁可以用 ConfigKLS1.freeze() 得到一致的只读快照。
+        """
+        return cls.__nb_lock__
+
+    @classmethod
+    def merge_cls_attribute(cls, **kwargs):
+        """
+        和 update_cls_attribute 一样修改类属性，但值为嵌套配置实例的字段按结构深度合并，
+        例如 ConfigKLS1.merge_cls_attribute(redis={'host': 'prod'}) 只修改 redis.host ，redis 的其他配置保持不变，
+        并且 redis 仍然是嵌套的配置实例而不是字典。
+        """
+        layout = cls._get_fields_layout()
+        return cls.update_cls_attribute(**{k: merge_config_value(layout[k], v) if k in layout else v
+                                           for k, v in kwargs.items()})
+
+    @classmethod
+    def override(cls, **kwargs) -> _ConfigOverride:
+        """
+        在当前上下文(线程或者 asyncio 协程任务)中临时覆盖配置，不修改全局合并后的配置，适合按请求/租户使用不同的超时时间、地址等:
+
+            with ConfigKLS1.override(config_a='tenant_a'):
+                ConfigKLS1.config_a  # 'tenant_a'，同时运行的其他协程任务读到的仍然是合并后的值
+
+        作用域内读取类属性、实例化、freeze() 都使用覆盖后的值；嵌套的配置实例按结构深度合并。
+        覆盖层不改变 get_version() ，按版本号缓存的结果(cached_by_config_version)不感知覆盖层。
+        所有作用域都退出后覆盖层被整个拆掉，在作用域内创建、作用域退出后还在运行的协程任务之后读到的是合并后的值。
+        需要 python 3.7+ ，3.6 的 contextvars 向后移植包不会复制到 asyncio 协程任务中，覆盖会泄漏给同一线程的所有协程。
+        """
+        if sys.version_info < (3, 7):
+            raise RuntimeError('override() 需要 python 3.7+ ，python 3.6 不能保证每个 asyncio 协程任务的覆盖互不影响')
+        if cls.__nb_unmerged_instances__ is not None:
+            _raise_not_merged(cls)
+        layout = cls._get_fields_layout()
+        for k in kwargs:
+            if k not in layout:
+                raise ValueError(f'{k} 不是 {cls.__module__}.{cls.__name__} 的配置项，不能覆盖')
+        return _ConfigOverride(cls, kwargs)
+
+    @classmethod
+    def _install_overlay_fields(cls, names) -> 'contextvars.ContextVar':
+        """进入 override() 作用域: 作用域计数加一，把 names 这些字段换成覆盖层描述符，返回该类的覆盖层 ContextVar"""
+        with cls.__nb_lock__:
+            overlay_var = cls.__nb_overlay_var__
+            if overlay_var is None:
+                import contextvars  # 用到 override() 才导入
+                overlay_var = contextvars.ContextVar(f'nb_config_overlay_{cls.__module__}.{cls.__qualname__}',
+                                                     default=_EMPTY_OVERLAY)
+                type.__setattr__(cls, '__nb_overlay_var__', overlay_var)
+            for k in names:
+                current = cls.__dict__[k]
+                if not isinstance(current, _OverlayField):
+                    type.__setattr__(cls, k, _OverlayField(k, current, overlay_var))
+            type.__setattr__(cls, '__nb_overlay_scope_count__', cls.__nb_overlay_scope_count__ + 1)
+        return overlay_var
+
+    @classmethod
+    def _uninstall_overlay_fields(cls):
+        """退出 override() 作用域: 最后一个作用域退出时把覆盖层描述符换回普通的类属性，读取类属性恢复成没有额外开销"""
+        with cls.__nb_lock__:
+            count = cls.__nb_overlay_scope_count__ - 1
+            type.__setattr__(cls, '__nb_overlay_scope_count__', count)
+            if count:
+                return
+            for k, v in list(cls.__dict__.items()):
+                if isinstance(v, _OverlayField):
+                    type.__setattr__(cls, k, v.value)  # 字段布局里本来就是 v.value ，不需要重新生成
+
+    @classmethod
+    def _from_fields(cls, values: dict):
+        """直接用字段值生成实例，实例的 __dict__ 是 values 的副本，不从类的字段布局复制"""
+        self = object.__new__(cls)
+        self.__dict__ = dict(values)
+        object.__setattr__(self, '_nb_delta_base', None)
+        object.__setattr__(self, '_nb_src_layout', values)  # values 不会再被修改，可以作为序列化缓存键
+        return self
+
+    @classmethod
+    def _get_default_fields(cls) -> dict:
+        """返回第一次合并用户配置之前的字段值，重新加载用户配置时，用户删掉的配置项需要恢复成这些默认值"""
+        default_fields = cls.__dict__.get('__nb_default_fields__')
+        if default_fields is None:
+            default_fields = dict(cls._get_fields_layout())
+            type.__setattr__(cls, '__nb_default_fields__', default_fields)
+        return default_fields
+
     def update_instance_attribute(self, **kwargs):
         for k, v in kwargs.items():
             setattr(self, k, v)
@@ -78,6 +684,86 @@ class DataClassBase:
         if cls.has_merged_config is False:
             raise ValueError(f'{cls.__name__} 的配置没有被合并')
 
+    @classmethod
+    def freeze(cls, **kwargs) -> 'FrozenConfigBase':
+        """
+        返回当前配置的只读快照，快照类型是按配置类生成的 __slots__ 类，没有实例 __dict__ ，适合大量分发给协程或者缓存起来。
+        不传 kwargs 时，同一份类配置只会生成一个快照对象，类属性被修改后下次调用才重新生成。
+        """
+        if cls.__nb_unmerged_instances__ is not None:
+            _raise_not_merged(cls)
+        layout = cls._get_fields_layout()
+        if not kwargs and cls.__nb_overlay_scope_count__:
+            kwargs = cls.__nb_overlay_var__.get()  # 在 override() 作用域内，快照也使用覆盖后的值
+        if not kwargs:
+            cached = cls.__dict__.get('__nb_frozen_snapshot__')
+            if cached is not None and cached[0] is layout:
+                return cached[1]
+            snapshot = cls._get_frozen_type()._from_dict(layout)
+            type.__setattr__(cls, '__nb_frozen_snapshot__', (layout, snapshot))
+            return snapshot
+        values = dict(layout)
+        values.update(kwargs)
+        return cls._get_frozen_type()._from_dict(values)
+
+    @classmethod
+    def _get_frozen_type(cls) -> typing.Type['FrozenConfigBase']:
+        field_names = tuple(cls._get_fields_layout())
+        frozen_type = cls.__dict__.get('__nb_frozen_type__')
+        if frozen_type is None or frozen_type.__nb_field_names__ != field_names:
+            frozen_type = type(f'{cls.__name__}Frozen', (FrozenConfigBase,), {
+                '__slots__': field_names,
+                '__nb_field_names__': field_names,
+                '__nb_config_cls__': cls,
+                '__module__': cls.__module__,
+            })
+            type.__setattr__(cls, '__nb_frozen_type__', frozen_type)
+        return frozen_type
+
+
+class FrozenConfigBase:
+    """
+    DataClassBase.freeze() 生成的只读配置快照的基类，具体的快照类型按配置类动态生成。
+    和 DataClassBase 实例一样有 get_dict() / __getitem__ / get_json() ，但不能修改属性。
+    """
+    __slots__ = ()
+    __nb_field_names__ = ()
+    __nb_config_cls__ = None
+
+    @classmethod
+    def _from_dict(cls, values: dict):
+        self = object.__new__(cls)
+        for k in cls.__nb_field_names__:
+            object.__setattr__(self, k, _freeze_value(values[k]))
+        return self
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'{self.__class__.__name__} 是只读的配置快照，不能设置 {key}')
+
+    def __delattr__(self, key):
+        raise AttributeError(f'{self.__class__.__name__} 是只读的配置快照，不能删除 {key}')
+
+    def get_dict(self):
+        return {k: v.get_dict() if isinstance(v, (DataClassBase, FrozenConfigBase)) else v
+                for k, v in ((k, getattr(self, k)) for k in self.__nb_field_names__)}
+
+    def __str__(self):
+        return f"{self.__class__}    {self.get_dict()}"
+
+    def __getitem__(self, item):
+        return getattr(self, item)
+
+    def get_json(self, indent=4):
+        return dict_to_un_strict_json(self.get_dict(), indent=indent, is_use_orjson=self.__nb_config_cls__.__use_orjson__)
+
+
+def _freeze_value(v):
+    if type(v) is str:
+        return sys.intern(v)  # 多个快照/多个配置类中相同的字符串只保留一份
+    if isinstance(v, DataClassBase):
+        return type(v).freeze(**v._get_field_values())
+    return v
+
 
 if __name__ == '__main__':
     import datetime
@@ -0,0 +1,278 @@
+"""
+DataClassBase 相关的微基准测试，在项目根目录设置好 PYTHONPATH 后直接运行这个文件即可:
+
+    python tests/benchmarks/bench_data_class.py
+"""
+import asyncio
+import sys
+import time
+import timeit
+import tracemalloc
+
+import json
+
+from nb_config import DataClassBase
+from nb_config.simple_data_class import merge_config_value
+
+
+def make_config_cls(field_count: int, name: str = 'BenchConfig'):
+    """动态生成一个有 field_count 个字段的配置类"""
+    attrs = {f'field_{i}': f'value_{i}' for i in range(field_count)}
+    return type(f'{name}{field_count}', (DataClassBase,), attrs)
+
+
+def _old_style_new(cls):
+    """旧版 DataClassBase.__new__ 的实现，每次实例化都扫描一遍 cls.__dict__"""
+    self = object.__new__(cls)
+    self.__dict__ = {k: v for k, v in cls.__dict__.items() if not k.startswith('__')}
+    self.__dict__.pop('has_merged_config', None)
+    return self
+
+
+def bench_construction(number: int = 20000):
+    print('==== 实例化耗时 (每次实例化的微秒数) ====')
+    for field_count in (5, 50, 500):
+        cls = make_config_cls(field_count)
+        old_cost = timeit.timeit(lambda: _old_style_new(cls), number=number) / number * 1e6
+        new_cost = timeit.timeit(cls, number=number) / number * 1e6
+        print(f'{field_count:>4} 个字段:  扫描 cls.__dict__ {old_cost:8.3f} us    缓存字段布局 {new_cost:8.3f} us')
+
+
+def _measure_per_object_bytes(factory, count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objs = [factory(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del objs
+    return total / count
+
+
+def bench_freeze_memory(field_count: int = 200, count: int = 2000):
+    print(f'==== {field_count} 个字段的配置类，每个对象占用的内存 ====')
+    cls = make_config_cls(field_count)
+    dict_bytes = _measure_per_object_bytes(lambda i: cls(field_0=i), count)
+    frozen_bytes = _measure_per_object_bytes(lambda i: cls.freeze(field_0=i), count)
+    print(f'DataClassBase 实例: {dict_bytes:10.1f} bytes')
+    print(f'freeze() 快照     : {frozen_bytes:10.1f} bytes')
+    print(f'不传参数的 freeze() 在类配置不变时总是返回同一个对象: {cls.freeze() is cls.freeze()}')
+
+
+def make_nested_config_cls(nested_count: int = 5, field_count: int = 30):
+    """生成一个顶层配置类，里面嵌套 nested_count 个各有 field_count 个字段的配置实例"""
+    attrs = {f'field_{i}': i for i in range(field_count)}
+    for n in range(nested_count):
+        attrs[f'nested_{n}'] = make_config_cls(field_count, name=f'BenchNested{n}_')()
+    return type('BenchNestedRoot', (DataClassBase,), attrs)
+
+
+def _old_style_get_json(obj, indent=4):
+    """旧版的序列化路径: 每次都递归 get_dict 再用标准库 json.dumps"""
+    d = {k: _old_style_get_json_dict(v) if isinstance(v, DataClassBase) else v for k, v in obj.__dict__.items()}
+    d = {k: v if isinstance(v, (bool, tuple, dict, float, int)) else str(v) for k, v in d.items()}
+    return json.dumps(d, ensure_ascii=False, indent=indent)
+
+
+def _old_style_get_json_dict(obj):
+    return {k: _old_style_get_json_dict(v) if isinstance(v, DataClassBase) else v for k, v in obj.__dict__.items()}
+
+
+def bench_serialization(number: int = 2000):
+    print('==== 嵌套配置序列化耗时 (每次调用的微秒数) ====')
+    cls = make_nested_config_cls()
+    obj = cls()
+    modified_obj = cls(field_0=-1)
+    cases = [
+        ('旧实现 get_dict + json.dumps(indent=4)', lambda: _old_style_get_json(obj)),
+        ('get_json(indent=4) 按类版本缓存', lambda: obj.get_json()),
+        ('get_json(indent=None) 按类版本缓存', lambda: obj.get_json(indent=None)),
+        ('被修改过的实例 get_json(indent=4)', lambda: modified_obj.get_json()),
+        ('被修改过的实例 get_json(indent=None)', lambda: modified_obj.get_json(indent=None)),
+        ('get_dict()', lambda: obj.get_dict()),
+    ]
+    for desc, fun in cases:
+        cost = timeit.timeit(fun, number=number) / number * 1e6
+        print(f'{cost:10.3f} us    {desc}')
+
+
+def bench_strict_attribute_read(number: int = 1000000):
+    print('==== 合并完成后读取类属性的耗时 (每次读取的纳秒数) ====')
+    plain_cls = make_config_cls(20, name='BenchPlain')
+    strict_cls = type('BenchStrict', (DataClassBase,), {'__strict_merge__': True, 'field_0': 'value_0'})
+    strict_cls.has_merged_config = True
+    plain_cls.has_merged_config = True
+
+    def _check_then_read():
+        plain_cls.check_has_merged_config()
+        return plain_cls.field_0
+
+    cases = [
+        ('普通模式读取类属性', lambda: plain_cls.field_0),
+        ('普通模式先 check_has_merged_config() 再读取', _check_then_read),
+        ('严格模式合并后读取类属性', lambda: strict_cls.field_0),
+    ]
+    for desc, fun in cases:
+        cost = timeit.timeit(fun, number=number) / number * 1e9
+        print(f'{cost:8.1f} ns    {desc}')
+
+
+def _old_style_update_cls_attribute(cls, **kwargs):
+    """旧版 update_cls_attribute: 不加锁，逐个 setattr ，每设置一个属性就让字段布局失效一次"""
+    for k, v in kwargs.items():
+        type.__setattr__(cls, k, v)
+        cls._invalidate_fields_layout()
+    return cls
+
+
+def bench_merge_throughput(number: int = 20000, field_count: int = 20):
+    print(f'==== 合并 {field_count} 个配置项的吞吐量 (每秒次数) ====')
+    cls = make_config_cls(field_count, name='BenchMerge')
+    counter = iter(range(10 ** 9))
+
+    def _new_values():
+        i = next(counter)
+        return {f'field_{f}': i for f in range(field_count)}
+
+    cases = [
+        ('旧实现 逐个 setattr 不加锁', lambda: _old_style_update_cls_attribute(cls, **_new_values())),
+        ('update_cls_attribute 按类加锁 + 写时复制一次性替换', lambda: cls.update_cls_attribute(**_new_values())),
+    ]
+    for desc, fun in cases:
+        cost = timeit.timeit(fun, number=number)
+        cls()  # 让字段布局重新生成，两种实现的起点一致
+        print(f'{number / cost:12.0f} 次/秒    {desc}')
+    cost = timeit.timeit(lambda: cls.freeze().field_0, number=number * 10)
+    print(f'{number * 10 / cost:12.0f} 次/秒    无锁读取一致快照 freeze()')
+
+    def _locked_read():
+        with cls.config_lock():
+            return cls.field_0, cls.field_1
+
+    cost = timeit.timeit(_locked_read, number=number * 10)
+    print(f'{number * 10 / cost:12.0f} 次/秒    持有 config_lock() 读取两个类属性')
+
+
+def make_config_tree(depth: int = 5, fan_out: int = 4, leaf_count: int = 4, _path: str = 'Tree'):
+    """生成 depth 层的嵌套配置实例，每层 fan_out 个子配置，最底层每个配置 leaf_count 个叶子，默认 4**4*4=1024 个叶子"""
+    if depth == 1:
+        attrs = {f'leaf_{i}': i for i in range(leaf_count)}
+    else:
+        attrs = {f'child_{i}': make_config_tree(depth - 1, fan_out, leaf_count, f'{_path}_{i}') for i in range(fan_out)}
+    return type(_path, (DataClassBase,), attrs)()
+
+
+def _count_leaves(obj) -> int:
+    return sum(_count_leaves(v) if isinstance(v, DataClassBase) else 1 for v in obj.__dict__.values())
+
+
+def _full_copy_merge(base, override):
+    """每个节点都重建一遍的合并方式，作为没有结构共享时的对照"""
+    values = {k: _full_copy_merge(v, override.get(k, {})) if isinstance(v, DataClassBase) else override.get(k, v)
+              for k, v in base.__dict__.items()}
+    return type(base)._from_fields(values)
+
+
+def _count_shared_nodes(a, b) -> int:
+    shared = 0
+    for k, v in a.__dict__.items():
+        if isinstance(v, DataClassBase):
+            shared += 1 if b.__dict__[k] is v else _count_shared_nodes(v, b.__dict__[k])
+    return shared
+
+
+def bench_nested_merge(number: int = 2000):
+    tree = make_config_tree()
+    print(f'==== 5 层 {_count_leaves(tree)} 个叶子的嵌套配置，用户只覆盖一个叶子 (每次合并的微秒数) ====')
+    override = {'child_1': {'child_2': {'child_3': {'child_0': {'leaf_1': -1}}}}}
+    same_override = {'child_1': {'child_2': {'child_3': {'child_0': {'leaf_1': 1}}}}}
+    cases = [
+        ('旧实现 整个替换成用户的字典 (丢失其他 1023 个叶子)', lambda: override),
+        ('每个节点都复制一遍的深度合并', lambda: _full_copy_merge(tree, override)),
+        ('merge_config_value 结构共享的深度合并', lambda: merge_config_value(tree, override)),
+        ('merge_config_value 覆盖值和原值相同', lambda: merge_config_value(tree, same_override)),
+    ]
+    for desc, fun in cases:
+        cost = timeit.timeit(fun, number=number) / number * 1e6
+        print(f'{cost:10.3f} us    {desc}')
+    merged = merge_config_value(tree, override)
+    print(f'合并后直接复用原对象的子树个数: {_count_shared_nodes(tree, merged)}，'
+          f'叶子仍然是 {_count_leaves(merged)} 个，覆盖后的值: {merged.child_1.child_2.child_3.child_0.leaf_1}')
+
+
+def bench_context_override(task_count: int = 10000, field_count: int = 50, read_count: int = 20):
+    print('==== override() 覆盖层读取类属性的耗时 (每次读取的纳秒数) ====')
+    cls = make_config_cls(field_count, name='BenchOverride')
+    number = 1000000
+    cost = timeit.timeit('cls.field_0', globals={'cls': cls}, number=number) / number * 1e9
+    print(f'{cost:8.1f} ns    普通类属性')
+    with cls.override(field_1='x'):
+        pass  # 作用域退出后 field_1 换回普通类属性
+    cost = timeit.timeit('cls.field_1', globals={'cls': cls}, number=number) / number * 1e9
+    print(f'{cost:8.1f} ns    用过 override() 的类属性，所有作用域都退出后')
+    with cls.override(field_1='x'):
+        cost = timeit.timeit('cls.field_1', globals={'cls': cls}, number=number) / number * 1e9
+    print(f'{cost:8.1f} ns    用过 override() 的类属性，作用域内')
+
+    print(f'==== {task_count} 个并发协程任务各自使用不同的配置 ({field_count} 个字段，每个任务读取 {read_count} 次) ====')
+
+    async def _task_with_instance(i):
+        config = cls(field_1=i)
+        await asyncio.sleep(0)
+        return sum(1 for _ in range(read_count) if config.field_1 == i)
+
+    async def _task_with_override(i):
+        with cls.override(field_1=i):
+            await asyncio.sleep(0)
+            return sum(1 for _ in range(read_count) if cls.field_1 == i)
+
+    for desc, task in (('每个请求实例化 ConfigKLS1(**overrides)', _task_with_instance),
+                       ('with ConfigKLS1.override(**overrides)', _task_with_override)):
+        async def _main():
+            return await asyncio.gather(*(task(i) for i in range(task_count)))
+
+        t0 = time.perf_counter()
+        results = asyncio.run(_main())
+        cost = (time.perf_counter() - t0) * 1000
+        assert results == [read_count] * task_count
+        tracemalloc.start()  # 单独跑一遍统计内存，tracemalloc 会拖慢上面的计时
+        asyncio.run(_main())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'{cost:8.2f} ms    内存峰值 {peak / 1024 / 1024:6.2f} MB    {desc}')
+
+
+def bench_delta_instance(number: int = 20000, count: int = 2000):
+    from nb_config import simple_data_class
+    min_fields = simple_data_class._DELTA_INSTANCE_MIN_FIELDS
+    print(f'==== ConfigKLS1(field_0=x) 只覆盖一个字段: 复制全部字段 vs 只记录被覆盖的字段 '
+          f'(默认字段数不少于 {min_fields} 的配置类才只记录被覆盖的字段) ====')
+    for field_count in (5, 30, 64, 300):
+        results = []
+        for is_delta in (False, True):
+            # 通过字段数门槛强制同一个配置类使用其中一种实例
+            simple_data_class._DELTA_INSTANCE_MIN_FIELDS = 0 if is_delta else sys.maxsize
+            cls = make_config_cls(field_count, name=f'BenchDelta{is_delta}_')
+            cost = timeit.timeit('cls(field_0="x")', globals={'cls': cls}, number=number) / number * 1e6
+            results.append((cost, _measure_per_object_bytes(lambda i: cls(field_0=i), count)))
+        simple_data_class._DELTA_INSTANCE_MIN_FIELDS = min_fields
+        (eager_cost, eager_bytes), (delta_cost, delta_bytes) = results
+        print(f'{field_count:>4} 个字段:  复制全部字段 {eager_cost:7.3f} us {eager_bytes:9.1f} bytes    '
+              f'只记录覆盖的字段 {delta_cost:7.3f} us {delta_bytes:9.1f} bytes')
+    cls = make_config_cls(300, name='BenchDeltaMaterialize')
+    instances = [cls(field_0=i) for i in range(count)]
+    t0 = time.perf_counter()
+    cls.update_cls_attribute(field_1='merged')
+    cost = (time.perf_counter() - t0) * 1000
+    assert instances[0].field_1 == 'value_1'
+    print(f'{count} 个存活实例时修改一次类属性(先补全这些实例): {cost:.2f} ms')
+
+if __name__ == '__main__':
+    bench_construction()
+    bench_freeze_memory()
+    bench_serialization()
+    bench_strict_attribute_read()
+    bench_merge_throughput()
+    bench_nested_merge()
+    bench_context_override()
+    bench_delta_instance()
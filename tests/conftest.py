@@ -0,0 +1,36 @@
+"""
+测试共用的 fixture 。
+"""
+import itertools
+import sys
+
+import pytest
+
+_pkg_counter = itertools.count()
+
+
+@pytest.fixture
+def make_config_package(tmp_path, monkeypatch):
+    """
+    在 tmp_path 下创建名字唯一的测试包(默认配置模块、用户配置模块等)，并把 tmp_path 加到 sys.path 。
+    make_config_package({模块名: 源码行的列表或者源码字符串}, init_source='') 返回包的文件夹，包名是 pkg_dir.name ，
+    模块之间用相对导入引用同一个包里的模块。每次创建的包名都不同，不会和其他测试已经导入的模块串用，测试结束后从 sys.modules 中移除。
+    """
+    monkeypatch.syspath_prepend(str(tmp_path))
+    pkg_names = []
+
+    def _make(modules: dict, init_source: str = ''):
+        pkg_dir = tmp_path / f'nb_config_test_pkg_{next(_pkg_counter)}'
+        pkg_dir.mkdir()
+        (pkg_dir / '__init__.py').write_text(init_source, encoding='utf-8')
+        for module_name, source in modules.items():
+            if not isinstance(source, str):
+                source = '\n'.join(source)
+            (pkg_dir / f'{module_name}.py').write_text(source, encoding='utf-8')
+        pkg_names.append(pkg_dir.name)
+        return pkg_dir
+
+    yield _make
+    for name in list(sys.modules):
+        if name.split('.', 1)[0] in pkg_names:
+            del sys.modules[name]
@@ -0,0 +1,50 @@
+"""
+get_json() 的测试: 默认只用标准库 json ，装没装 orjson 输出都一样；__use_orjson__ 为True时才用 orjson ，
+含有 nan/inf 时仍然用标准库 json ，不会被输出成 null 。
+"""
+import json
+
+import pytest
+
+from nb_config import DataClassBase
+
+
+class FloatConfig(DataClassBase):
+    ratio = 1e-07
+    limit = float('inf')
+    nested = {'threshold': float('nan'), 'items': (1, 2)}
+    name = '名字'
+
+
+def _stdlib_json(config_cls, indent):
+    separators = (',', ':') if indent is None else None
+    return json.dumps(config_cls().get_dict(), ensure_ascii=False, indent=indent, separators=separators)
+
+
+@pytest.mark.parametrize('indent', [None, 2, 4])
+def test_default_output_is_stdlib_json(indent):
+    assert FloatConfig().get_json(indent=indent) == _stdlib_json(FloatConfig, indent)
+    assert FloatConfig.freeze().get_json(indent=indent) == _stdlib_json(FloatConfig, indent)
+    assert '1e-07' in FloatConfig().get_json(indent=indent)
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+def test_orjson_keeps_non_finite_floats(indent):
+    pytest.importorskip('orjson')
+
+    class OrjsonFloatConfig(DataClassBase):
+        __use_orjson__ = True
+        ratio = 1e-07
+        limit = float('inf')
+        nested = {'threshold': float('nan'), 'items': (1, 2)}
+
+    assert OrjsonFloatConfig().get_json(indent=indent) == _stdlib_json(OrjsonFloatConfig, indent)
+    assert OrjsonFloatConfig.freeze().get_json(indent=indent) == _stdlib_json(OrjsonFloatConfig, indent)
+    assert 'NaN' in OrjsonFloatConfig().get_pwd_enc_json(indent=indent)
+
+    class OrjsonFiniteConfig(DataClassBase):
+        __use_orjson__ = True
+        ratio = 0.5
+        items = (1, 2)
+
+    assert json.loads(OrjsonFiniteConfig().get_json(indent=indent)) == {'ratio': 0.5, 'items': [1, 2]}
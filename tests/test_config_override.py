@@ -0,0 +1,106 @@
+"""
+ConfigKLS1.override() 上下文覆盖层的测试: 作用域内外读到的值、嵌套作用域、并发协程任务互不影响、作用域内修改合并后的值。
+"""
+import asyncio
+import sys
+
+import pytest
+
+from nb_config import DataClassBase
+
+
+class RedisConf(DataClassBase):
+    host = 'localhost'
+    port = 6379
+
+
+class OverrideConfig(DataClassBase):
+    timeout = 10
+    endpoint = 'http://default'
+    redis = RedisConf()
+
+
+def test_override_is_scoped_and_nested():
+    with OverrideConfig.override(timeout=1, redis={'host': 'tenant_redis'}):
+        assert OverrideConfig.timeout == 1
+        assert OverrideConfig.redis.get_dict() == {'host': 'tenant_redis', 'port': 6379}
+        assert OverrideConfig().timeout == 1
+        assert OverrideConfig.freeze().timeout == 1
+        with OverrideConfig.override(endpoint='http://inner'):
+            assert (OverrideConfig.timeout, OverrideConfig.endpoint) == (1, 'http://inner')
+        assert OverrideConfig.endpoint == 'http://default'
+    assert OverrideConfig.timeout == 10
+    assert OverrideConfig.redis.host == 'localhost'
+    assert OverrideConfig().get_dict() == {'timeout': 10, 'endpoint': 'http://default',
+                                           'redis': {'host': 'localhost', 'port': 6379}}
+    assert OverrideConfig.freeze().timeout == 10
+
+
+def test_concurrent_tasks_see_their_own_overlay():
+    async def _task(i):
+        with OverrideConfig.override(timeout=i):
+            await asyncio.sleep(0.001 * (10 - i))
+            return OverrideConfig.timeout
+
+    async def _main():
+        return await asyncio.gather(*(_task(i) for i in range(10)))
+
+    assert asyncio.run(_main()) == list(range(10))
+    assert OverrideConfig.timeout == 10
+
+
+def test_merge_during_scope_updates_value_outside_scope():
+    class UpdatedConfig(DataClassBase):
+        timeout = 10
+        endpoint = 'http://default'
+
+    with UpdatedConfig.override(timeout=1):
+        UpdatedConfig.update_cls_attribute(timeout=20, endpoint='http://merged')
+        assert (UpdatedConfig.timeout, UpdatedConfig.endpoint) == (1, 'http://merged')
+    assert UpdatedConfig.timeout == 20
+    UpdatedConfig.timeout = 30
+    assert UpdatedConfig.timeout == UpdatedConfig().timeout == 30
+
+
+def test_override_rejects_unknown_keys_and_unmerged_strict_classes():
+    with pytest.raises(ValueError):
+        OverrideConfig.override(not_a_field=1)
+
+    class StrictConfig(DataClassBase):
+        __strict_merge__ = True
+        timeout = 10
+
+    with pytest.raises(ValueError):
+        StrictConfig.override(timeout=1)
+
+
+def test_plain_class_attributes_are_restored_after_last_scope():
+    from nb_config.simple_data_class import _OverlayField
+
+    class RestoredConfig(DataClassBase):
+        timeout = 10
+        endpoint = 'http://default'
+
+    outer = RestoredConfig.override(timeout=1)
+    inner = RestoredConfig.override(endpoint='http://inner')
+    with outer:
+        with inner:
+            assert isinstance(RestoredConfig.__dict__['endpoint'], _OverlayField)
+        assert isinstance(RestoredConfig.__dict__['timeout'], _OverlayField)  # 外层作用域还在
+        assert RestoredConfig.timeout == 1
+    assert type(RestoredConfig.__dict__['timeout']) is int and type(RestoredConfig.__dict__['endpoint']) is str
+    assert RestoredConfig.__nb_overlay_scope_count__ == 0
+    assert (RestoredConfig.timeout, RestoredConfig().timeout) == (10, 10)
+
+    with pytest.raises(KeyError):
+        with RestoredConfig.override(timeout={'nested': 1}, endpoint=object()):
+            raise KeyError
+    assert RestoredConfig.__nb_overlay_scope_count__ == 0
+    assert RestoredConfig.timeout == 10
+
+
+def test_override_requires_python_37(monkeypatch):
+    monkeypatch.setattr(sys, 'version_info', (3, 6, 15))
+    with pytest.raises(RuntimeError):
+        OverrideConfig.override(timeout=1)
+    assert OverrideConfig.timeout == 10
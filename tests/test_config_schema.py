@@ -0,0 +1,130 @@
+"""
+config_schema 的测试: 按类型注解严格转换用户配置的值；没有注解时按默认值类型只把字符串转换成数字或 bool ，
+其他类型的值原样保留，并且宽松地允许 None ；转换失败时报告用户配置文件中赋值所在的 "文件:行号" 。
+"""
+import logging
+from pathlib import Path
+import typing
+
+import pytest
+
+from nb_config import DataClassBase
+from nb_config.config_schema import coerce_user_values, compile_schema, find_assignment_line
+
+
+class SchemaConfig(DataClassBase):
+    port: int = 6379
+    ratio: float = 0.5
+    name: str = 'svc'
+    is_debug: bool = False
+    hosts: list = []
+    pair: tuple = (1, 2)
+    options: dict = {}
+    maybe_port: typing.Optional[int] = 1
+    token: str = None
+    id_or_name: typing.Union[int, str] = 1
+    timeout = 10
+    endpoint = 'http://default'
+    log_level = 'DEBUG'
+    is_verbose = False
+    extra_hosts = []
+    anything = object()
+
+
+def _coerce(**user_values):
+    errors = []
+    result = coerce_user_values(SchemaConfig, user_values, None, 'SchemaConfig', errors)
+    return result, errors
+
+
+@pytest.mark.parametrize('key, raw, expected', [
+    ('port', '5432', 5432),
+    ('port', 5432.0, 5432),
+    ('ratio', '1.5', 1.5),
+    ('ratio', 2, 2.0),
+    ('name', 8080, '8080'),
+    ('is_debug', 'Yes', True),
+    ('is_debug', 0, False),
+    ('hosts', '["a", "b"]', ['a', 'b']),
+    ('pair', [3, 4], (3, 4)),
+    ('options', '{"k": 1}', {'k': 1}),
+    ('maybe_port', None, None),
+    ('maybe_port', '7', 7),
+    ('token', None, None),  # 有注解但默认值是 None ，允许 None
+    ('id_or_name', 'abc', 'abc'),
+    ('timeout', 0.5, 0.5),  # 没有注解的 int 默认值也接受小数
+    ('timeout', '3', 3),
+    ('timeout', None, None),  # 没有注解时宽松地允许 None
+    ('endpoint', None, None),
+    ('endpoint', ['x'], ['x']),  # 没有注解的 str 默认值不校验
+    ('is_verbose', 'off', False),
+    ('is_verbose', 1, 1),  # 没有注解时只转换字符串
+    ('extra_hosts', '["a"]', '["a"]'),
+    ('anything', 'whatever', 'whatever'),  # 推断不出类型的不校验
+    ('not_a_field', 'x', 'x'),
+])
+def test_values_are_coerced(key, raw, expected):
+    result, errors = _coerce(**{key: raw})
+    assert errors == []
+    assert result[key] == expected and type(result[key]) is type(expected)
+
+
+@pytest.mark.parametrize('key, raw', [
+    ('port', 'abc'),
+    ('port', None),  # 有注解并且默认值不是 None ，不允许 None
+    ('port', True),
+    ('port', 1.5),
+    ('is_debug', 'maybe'),
+    ('hosts', 'not json'),
+    ('options', [1]),
+    ('id_or_name', 1.5),
+    ('timeout', 'abc'),
+    ('is_verbose', 'maybe'),
+])
+def test_bad_values_are_reported(key, raw):
+    _, errors = _coerce(**{key: raw})
+    assert len(errors) == 1 and f'SchemaConfig.{key} = {raw!r} 的类型不对' in errors[0]
+
+
+def test_unannotated_str_default_keeps_non_str_values():
+    log_dir = Path('/var/log/app')
+    result, errors = _coerce(endpoint=log_dir, log_level=logging.INFO)
+    assert errors == []
+    assert result['endpoint'] is log_dir
+    assert result['log_level'] == logging.INFO and type(result['log_level']) is int  # 不会变成 '20'
+    logging.getLogger('nb_config_schema_test').setLevel(result['log_level'])
+
+
+def test_schema_is_compiled_once():
+    assert compile_schema(SchemaConfig) is compile_schema(SchemaConfig)
+    assert compile_schema(SchemaConfig)['timeout'].type_desc == 'int | float'
+
+
+_PY_USER_CONFIG = '''from nb_config import DataClassBase
+
+
+class SchemaConfig(DataClassBase):
+    name = 'x'
+    port: int = 'abc'
+    is_debug = 'maybe'
+'''
+
+
+def test_errors_report_file_and_line(tmp_path):
+    user_file = tmp_path / 'config_user.py'
+    user_file.write_text(_PY_USER_CONFIG, encoding='utf-8')
+    errors = []
+    coerce_user_values(SchemaConfig, {'name': 'x', 'port': 'abc', 'is_debug': 'maybe'}, str(user_file), 'SchemaConfig', errors)
+    assert [e.split(' ')[0] for e in errors] == [f'"{user_file}:6"', f'"{user_file}:7"']
+    assert find_assignment_line(str(user_file), 'SchemaConfig', 'not_written') == 4
+    assert find_assignment_line(str(user_file), 'OtherConfig', 'port') == 1
+
+
+def test_file_source_line_numbers(tmp_path):
+    toml_file = tmp_path / 'config_user.toml'
+    toml_file.write_text('[OtherConfig]\nport = 1\n\n[SchemaConfig]\nname = "x"\nport = "abc"\n', encoding='utf-8')
+    assert find_assignment_line(str(toml_file), 'SchemaConfig', 'port') == 6
+    assert find_assignment_line(str(toml_file), 'SchemaConfig', None) == 4
+    yaml_file = tmp_path / 'config_user.yaml'
+    yaml_file.write_text('SchemaConfig:\n  name: x\n  port: abc\n', encoding='utf-8')
+    assert find_assignment_line(str(yaml_file), 'SchemaConfig', 'port') == 3
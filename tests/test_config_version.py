@@ -0,0 +1,66 @@
+"""
+配置版本号的测试: get_version() 只在配置字段真的变化时变大，cached_by_config_version 按版本号缓存结果。
+"""
+from nb_config import DataClassBase, cached_by_config_version
+
+
+def _make_config_cls():
+    class VersionConfig(DataClassBase):
+        host = 'localhost'
+        port = 6379
+
+    return VersionConfig
+
+
+def test_version_changes_only_when_fields_change():
+    config_cls = _make_config_cls()
+    v0 = config_cls.get_version()
+    config_cls.update_cls_attribute(port=6379)  # 值没变
+    assert config_cls.get_version() == v0
+    config_cls.update_cls_attribute(port=6380)
+    v1 = config_cls.get_version()
+    assert v1 > v0
+    config_cls.host = 'redis'
+    v2 = config_cls.get_version()
+    assert v2 > v1
+    config_cls().port = 1  # 修改实例不影响类的版本号
+    with config_cls.override(port=2):  # 覆盖层也不影响
+        assert config_cls.get_version() == v2
+    assert config_cls.get_version() == v2
+
+
+def test_cached_by_config_version():
+    redis_cls, db_cls = _make_config_cls(), _make_config_cls()
+    calls = []
+
+    @cached_by_config_version(redis_cls, db_cls)
+    def _make_client(name, db=0):
+        calls.append((name, db))
+        return f'{name}@{redis_cls.host}:{redis_cls.port}/{db}'
+
+    assert _make_client('a') is _make_client('a')
+    assert _make_client('a', db=1) == 'a@localhost:6379/1'
+    assert calls == [('a', 0), ('a', 1)]
+
+    redis_cls.update_cls_attribute(port=6379)  # 没有变化，不重建
+    assert _make_client('a') == 'a@localhost:6379/0' and len(calls) == 2
+    db_cls.update_cls_attribute(port=5432)  # 任何一个配置类变化都会重建
+    assert _make_client('a') == 'a@localhost:6379/0' and len(calls) == 3
+    redis_cls.port = 6380
+    assert _make_client('a') == 'a@localhost:6380/0' and len(calls) == 4
+
+    _make_client.cache_clear()
+    _make_client('a')
+    assert len(calls) == 5
+
+
+def test_equal_nested_instance_does_not_change_version():
+    class NestedVersionConfig(DataClassBase):
+        redis = _make_config_cls()(port=6380)
+
+    version = NestedVersionConfig.get_version()
+    NestedVersionConfig.merge_cls_attribute(redis={'port': 6380})
+    NestedVersionConfig.update_cls_attribute(redis=type(NestedVersionConfig.redis)(port=6380))
+    assert NestedVersionConfig.get_version() == version
+    NestedVersionConfig.merge_cls_attribute(redis={'port': 6381})
+    assert NestedVersionConfig.get_version() > version
@@ -0,0 +1,66 @@
+"""
+多线程并发合并配置的压力测试:
+多个写线程反复用 update_cls_attribute 合并新配置，多个读线程同时读取，不能读到一半旧值一半新值的配置。
+保证一致的只有基于字段布局的读取(实例化、freeze()、get_dict())和持有 config_lock() 时的类属性读取；
+不加锁直接连续读取多个类属性不在保证范围内(合并时类属性是逐个设置的)，这里也不测试。
+"""
+import sys
+import threading
+import time
+
+from nb_config import DataClassBase
+
+WRITER_COUNT = 2
+READER_COUNT = 8
+MERGE_TIMES = 2000
+
+
+class StressConfig(DataClassBase):
+    config_a = (0, 0)
+    config_b = (0, 0)
+    config_c = (0, 0)
+    config_d = 'not merged'
+
+
+def _check_consistent(values: dict, desc: str, errors: list):
+    if not values['config_a'] == values['config_b'] == values['config_c']:
+        errors.append(f'{desc} 读到了合并了一半的配置: {values}')
+
+
+def test_no_torn_reads_during_repeated_merges():
+    old_switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # 让线程尽可能频繁地切换，增加交错执行的机会
+    errors = []
+    stop_event = threading.Event()
+
+    def _writer(writer_id):
+        for i in range(MERGE_TIMES):
+            generation = (writer_id, i)
+            StressConfig.update_cls_attribute(config_a=generation, config_b=generation, config_c=generation,
+                                              config_d=f'merged {generation}')
+
+    def _reader():
+        while not stop_event.is_set():
+            _check_consistent(StressConfig().get_dict(), '实例化', errors)
+            _check_consistent(StressConfig.freeze().get_dict(), 'freeze()', errors)
+            with StressConfig.config_lock():
+                _check_consistent({k: getattr(StressConfig, k) for k in ('config_a', 'config_b', 'config_c')},
+                                  '持有 config_lock() 读取类属性', errors)
+            time.sleep(0)  # 释放 GIL ，锁不是公平锁，读线程紧接着重新加锁会让等锁的写线程一直饿死
+
+    readers = [threading.Thread(target=_reader) for _ in range(READER_COUNT)]
+    writers = [threading.Thread(target=_writer, args=(w,)) for w in range(WRITER_COUNT)]
+    try:
+        for t in readers + writers:
+            t.start()
+        for t in writers:
+            t.join()
+        stop_event.set()
+        for t in readers:
+            t.join()
+    finally:
+        sys.setswitchinterval(old_switch_interval)
+
+    assert errors == [], errors[:5]
+    _check_consistent(StressConfig().get_dict(), '合并结束后', errors)
+    assert errors == []
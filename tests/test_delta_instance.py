@@ -0,0 +1,96 @@
+"""
+只记录被覆盖字段的实例(写时复制)的测试: 读取、get_dict/get_json 和完整复制的实例一致，
+类属性被修改后实例仍然是实例化时的配置，修改/删除实例属性、override() 作用域、严格模式、copy/pickle 都和以前一样。
+"""
+import copy
+import pickle
+
+from nb_config import DataClassBase
+from nb_config.simple_data_class import merge_config_value
+
+FIELD_COUNT = 80  # 不少于 _DELTA_INSTANCE_MIN_FIELDS
+
+
+def _make_big_config_cls(name='BigConfig', **extra):
+    attrs = {f'field_{i}': f'default_{i}' for i in range(FIELD_COUNT)}
+    attrs.update(extra)
+    return type(name, (DataClassBase,), attrs)
+
+
+def _expected_dict(**overrides):
+    values = {f'field_{i}': f'default_{i}' for i in range(FIELD_COUNT)}
+    values.update(overrides)
+    return values
+
+
+def test_delta_instance_reads_like_full_copy():
+    big_cls = _make_big_config_cls()
+    instance = big_cls(field_3='x', extra='e')
+    assert instance._nb_delta_base is not None
+    assert instance.__dict__ == {'field_3': 'x', 'extra': 'e'}
+    assert (instance.field_3, instance['field_4'], instance.extra) == ('x', 'default_4', 'e')
+    assert list(instance.get_dict().items()) == list(_expected_dict(field_3='x', extra='e').items())
+    assert instance.get_json(indent=None) == big_cls(field_3='x', extra='e').get_json(indent=None)
+    assert big_cls().get_dict() == _expected_dict()
+
+
+def test_class_mutation_keeps_instance_values():
+    big_cls = _make_big_config_cls()
+    first, second, third = big_cls(field_1='x'), big_cls(), big_cls()
+    big_cls.update_cls_attribute(field_2='merged')
+    big_cls.field_4 = 'assigned'
+    assert first._nb_delta_base is None
+    assert first.get_dict() == _expected_dict(field_1='x')
+    assert (second.field_2, second.field_4) == ('default_2', 'default_4')
+    del big_cls.field_5
+    assert third.field_5 == 'default_5'
+    expected = _expected_dict(field_1='y', field_2='merged', field_4='assigned')
+    del expected['field_5']
+    assert big_cls(field_1='y').get_dict() == expected
+
+
+def test_instance_mutation():
+    big_cls = _make_big_config_cls()
+    instance = big_cls().update_instance_attribute(field_0='a')
+    instance.field_1 = 'b'
+    assert instance.get_dict() == _expected_dict(field_0='a', field_1='b')
+    del instance.field_2
+    assert 'field_2' not in instance.get_dict()
+    assert instance.field_2 == 'default_2'  # 和以前一样，删除实例属性后读到类属性
+
+
+def test_override_scope_and_strict_mode():
+    big_cls = _make_big_config_cls()
+    outside = big_cls()
+    with big_cls.override(field_0='scoped'):
+        inside = big_cls()
+        assert (outside.field_0, inside.field_0, big_cls.field_0) == ('default_0', 'scoped', 'scoped')
+    assert inside.field_0 == 'scoped'
+
+    strict_cls = _make_big_config_cls('StrictBigConfig', __strict_merge__=True)
+    instance = strict_cls(field_0='x')
+    assert instance.get_dict() == _expected_dict(field_0='x')
+    assert not hasattr(instance, 'field_1')  # 合并之前读取没有传入的字段报错
+    strict_cls.update_cls_attribute(field_1='merged')
+    strict_cls.has_merged_config = True
+    assert (instance.field_0, instance.field_1) == ('x', 'merged')
+
+
+PickledBigConfig = _make_big_config_cls('PickledBigConfig')  # pickle 按模块属性查找类
+
+
+def test_copy_pickle_and_nested_merge():
+    instance = PickledBigConfig(field_0='x')
+    for i, duplicate in enumerate((copy.copy(instance), copy.deepcopy(instance), pickle.loads(pickle.dumps(instance)))):
+        PickledBigConfig.update_cls_attribute(field_1=f'merged_{i}')
+        assert duplicate.get_dict() == instance.get_dict() == _expected_dict(field_0='x')
+
+    merged = merge_config_value(PickledBigConfig(field_0='x'), {'field_2': 'y'})
+    assert merged.get_dict()['field_0'] == 'x' and merged.field_2 == 'y'
+
+
+def test_classes_with_method_fields_are_copied():
+    method_cls = _make_big_config_cls('MethodBigConfig', get_uri=lambda self: 'uri')
+    instance = method_cls(field_0='x')
+    assert instance._nb_delta_base is None
+    assert 'get_uri' in instance.__dict__
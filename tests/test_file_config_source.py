@@ -0,0 +1,102 @@
+"""
+toml/json/yaml 用户配置文件的测试: 按 section 覆盖默认配置类，自动生成的模板能被原样读回，大文件命中按内容缓存的解析结果。
+"""
+import importlib
+import os
+
+import pytest
+
+from nb_config import UserConfigAutoImporter
+from nb_config import file_config_source
+
+
+def _make_default_package(make_config_package):
+    pkg_dir = make_config_package({'config_default': [
+        'from nb_config import DataClassBase',
+        'class RedisConf(DataClassBase):',
+        '    host = "localhost"',
+        '    port = 6379',
+        'class ConfigKLS1(DataClassBase):',
+        '    config_a = "default_a"',
+        '    timeout = 10',
+        '    redis = RedisConf()',
+    ]})
+    return f'{pkg_dir.name}.config_default'
+
+
+@pytest.mark.parametrize('file_format', ['toml', 'json', 'yaml'])
+def test_template_round_trip_and_override(tmp_path, make_config_package, file_format):
+    default_path = _make_default_package(make_config_package)
+    user_file = tmp_path / f'config_user.{file_format}'
+    importer = UserConfigAutoImporter(str(user_file), default_path, is_show_final_config=False)
+    importer.auto_import_user_config()  # 文件不存在，自动生成模板后按模板合并，配置保持默认值
+    config_cls = importlib.import_module(default_path).ConfigKLS1
+    assert user_file.exists()
+    assert config_cls().get_dict() == {'config_a': 'default_a', 'timeout': 10, 'redis': {'host': 'localhost', 'port': 6379}}
+
+    overrides = {
+        'toml': '[ConfigKLS1]\ntimeout = "5"\n\n[ConfigKLS1.redis]\nhost = "10.0.0.2"\n',
+        'json': '{"ConfigKLS1": {"timeout": "5", "redis": {"host": "10.0.0.2"}}}',
+        'yaml': 'ConfigKLS1:\n  timeout: "5"\n  redis:\n    host: 10.0.0.2\n',
+    }
+    user_file.write_text(overrides[file_format], encoding='utf-8')
+    importer.auto_import_user_config()
+    assert config_cls.timeout == 5
+    assert config_cls.config_a == 'default_a'
+    assert config_cls.redis.get_dict() == {'host': '10.0.0.2', 'port': 6379}
+
+
+def test_unknown_section_and_bad_value_report_file_lines(tmp_path, make_config_package):
+    default_path = _make_default_package(make_config_package)
+    user_file = tmp_path / 'config_user.toml'
+    user_file.write_text('[ConfigKLS1]\ntimeout = "abc"\n\n[ConfigKLS2]\nx = 1\n', encoding='utf-8')
+    with pytest.raises(ValueError) as exc_info:
+        UserConfigAutoImporter(str(user_file), default_path, is_show_final_config=False).auto_import_user_config()
+    assert f'"{user_file}:2" ConfigKLS1.timeout' in str(exc_info.value)
+    assert f'"{user_file}:4" ConfigKLS2 不是' in str(exc_info.value)
+    assert importlib.import_module(default_path).ConfigKLS1.timeout == 10
+
+
+def test_large_file_uses_content_keyed_parse_cache(tmp_path, monkeypatch):
+    user_file = tmp_path / 'config_user.json'
+    user_file.write_text('{"ConfigKLS1": {%s}}' % ', '.join(f'"field_{i}": {i}' for i in range(20000)), encoding='utf-8')
+    assert user_file.stat().st_size >= file_config_source._MMAP_MIN_SIZE
+    cache_dir = tmp_path / 'cache'
+    sections = file_config_source.load_file_config_source(str(user_file), cache_dir).sections
+
+    def _fail_parse(*args):
+        raise AssertionError('内容没变时不应该再解析')
+
+    monkeypatch.setattr(file_config_source, '_parse_sections', _fail_parse)
+    assert file_config_source.load_file_config_source(str(user_file), cache_dir).sections == sections
+
+    user_file.write_text(user_file.read_text(encoding='utf-8').replace('"field_0": 0', '"field_0": 1'), encoding='utf-8')
+    with pytest.raises(AssertionError):
+        file_config_source.load_file_config_source(str(user_file), cache_dir)
+
+
+def test_parse_cache_is_plain_data_in_private_dir(tmp_path):
+    user_file = tmp_path / 'config_user.toml'
+    user_file.write_text('[ConfigKLS1]\n' + ''.join(f'field_{i} = [{i}, "{i}"]\n' for i in range(8000)), encoding='utf-8')
+    cache_dir = tmp_path / 'cache'
+    sections = file_config_source.load_file_config_source(str(user_file), cache_dir).sections
+    cache_file, = cache_dir.iterdir()
+    assert cache_file.suffix == '.marshal'
+    assert file_config_source._load_parse_cache(cache_file, 'other sha1') is None
+    cache_file.write_bytes(b'\x80\x04cos\nsystem\n.')  # pickle 数据不会被当成缓存
+    assert file_config_source.load_file_config_source(str(user_file), cache_dir).sections == sections
+
+    if hasattr(os, 'getuid'):
+        cache_dir.chmod(0o777)
+        cache_file.unlink()
+        file_config_source.load_file_config_source(str(user_file), cache_dir)
+        assert not list(cache_dir.iterdir())
+
+
+def test_values_marshal_cannot_store_are_not_cached(tmp_path):
+    user_file = tmp_path / 'config_user.toml'
+    user_file.write_text('[ConfigKLS1]\nstart = 2024-01-02T03:04:05\n' + ''.join(f'field_{i} = {i}\n' for i in range(8000)),
+                         encoding='utf-8')
+    cache_dir = tmp_path / 'cache'
+    assert file_config_source.load_file_config_source(str(user_file), cache_dir).sections['ConfigKLS1']['start'].year == 2024
+    assert not cache_dir.exists() or not list(cache_dir.iterdir())
@@ -0,0 +1,73 @@
+"""
+最终配置打印方式的测试: 默认同步打印完整json，summary 只打印一行，none 不打印但可以按需生成，background 在后台线程打印，
+final_config_print_interval 限制打印频率。
+"""
+import pytest
+
+from nb_config import UserConfigAutoImporter
+
+
+def _make_config_package(make_config_package):
+    pkg_dir = make_config_package({
+        'config_default': [
+            'from nb_config import DataClassBase',
+            'class ConfigKLS1(DataClassBase):',
+            '    config_a = "default_a"',
+            '    redis_password = "default_pwd"',
+        ],
+        'config_user': [
+            'from nb_config import DataClassBase',
+            'class ConfigKLS1(DataClassBase):',
+            '    config_a = "default_a"',
+            '    redis_password = "secret_pwd"',
+        ],
+    })
+    return f'{pkg_dir.name}.config_user', f'{pkg_dir.name}.config_default'
+
+
+def _import(make_config_package, **kwargs):
+    user_path, default_path = _make_config_package(make_config_package)
+    importer = UserConfigAutoImporter(user_path, default_path, is_auto_create_user_config_file=False, **kwargs)
+    importer.auto_import_user_config()
+    return importer, default_path
+
+
+def test_default_mode_prints_full_json(make_config_package, capsys):
+    _, default_path = _import(make_config_package)
+    out = capsys.readouterr().out
+    assert f'{default_path}.ConfigKLS1 的最终融合配置' in out
+    assert '"config_a": "default_a"' in out
+    assert 'secret_pwd' not in out
+
+
+def test_summary_mode_prints_one_line_of_key_names(make_config_package, capsys):
+    _import(make_config_package, final_config_print_mode='summary')
+    lines = capsys.readouterr().out.strip().splitlines()
+    assert len(lines) == 1
+    assert '1 个配置项被覆盖: [ConfigKLS1.redis_password]' in lines[0]
+    assert 'secret' not in lines[0]
+
+
+def test_none_mode_prints_nothing_but_renders_on_demand(make_config_package, capsys):
+    importer, default_path = _import(make_config_package, final_config_print_mode='none')
+    assert capsys.readouterr().out == ''
+    assert f'{default_path}.ConfigKLS1 的最终融合配置' in importer.render_final_config()
+    assert '[ConfigKLS1.redis_password]' in importer.render_final_config(is_summary=True)
+
+
+def test_background_mode_prints_snapshot_from_worker_thread(make_config_package, capsys):
+    importer, default_path = _import(make_config_package, final_config_print_mode='background')
+    importer._final_config_print_thread.join()
+    assert f'{default_path}.ConfigKLS1 的最终融合配置' in capsys.readouterr().out
+
+
+def test_print_interval_skips_frequent_reprints(make_config_package, capsys):
+    importer, _ = _import(make_config_package, final_config_print_mode='summary', final_config_print_interval=3600)
+    importer.overwrite_default_config_with_user_config()
+    importer.overwrite_default_config_with_user_config()
+    assert len(capsys.readouterr().out.strip().splitlines()) == 1
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        UserConfigAutoImporter('config_user', 'config_default', final_config_print_mode='quiet')
@@ -0,0 +1,64 @@
+"""
+UserConfigAutoImporter.install_import_hook() 的测试: 登记时不导入任何模块，默认配置模块第一次 import 时才合并，
+已经导入过时立即合并，合并出错时那次 import 失败、下次 import 重新合并。
+"""
+import importlib
+import sys
+
+import pytest
+
+from nb_config import UserConfigAutoImporter
+
+_USER_CONFIG_LINES = [
+    'from nb_config import DataClassBase',
+    'class ConfigKLS1(DataClassBase):',
+    '    config_a = "user_a"',
+    '    config_b = "default_b"',
+]
+
+
+def _make_config_package(make_config_package, is_write_user_config=True):
+    modules = {'config_default': [
+        'from nb_config import DataClassBase',
+        'class ConfigKLS1(DataClassBase):',
+        '    config_a = "default_a"',
+        '    config_b = "default_b"',
+    ]}
+    if is_write_user_config:
+        modules['config_user'] = _USER_CONFIG_LINES
+    pkg_dir = make_config_package(modules)
+    return pkg_dir, f'{pkg_dir.name}.config_user', f'{pkg_dir.name}.config_default'
+
+
+def test_merge_happens_on_first_import_of_default_module(make_config_package):
+    _, user_path, default_path = _make_config_package(make_config_package)
+    UserConfigAutoImporter(user_path, default_path, is_auto_create_user_config_file=False,
+                           is_show_final_config=False).install_import_hook()
+    assert default_path not in sys.modules
+    assert user_path not in sys.modules
+
+    default_m = importlib.import_module(default_path)
+    assert user_path in sys.modules
+    assert default_m.ConfigKLS1.config_a == 'user_a'
+    assert default_m.ConfigKLS1.has_merged_config is True
+
+
+def test_merge_happens_immediately_when_default_module_already_imported(make_config_package):
+    _, user_path, default_path = _make_config_package(make_config_package)
+    default_m = importlib.import_module(default_path)
+    UserConfigAutoImporter(user_path, default_path, is_auto_create_user_config_file=False,
+                           is_show_final_config=False).install_import_hook()
+    assert default_m.ConfigKLS1.config_a == 'user_a'
+
+
+def test_failed_merge_fails_the_import_and_retries_next_time(make_config_package):
+    pkg_dir, user_path, default_path = _make_config_package(make_config_package, is_write_user_config=False)
+    UserConfigAutoImporter(user_path, default_path, is_auto_create_user_config_file=False,
+                           is_show_final_config=False).install_import_hook()
+    with pytest.raises(EnvironmentError):
+        importlib.import_module(default_path)
+    assert default_path not in sys.modules
+
+    (pkg_dir / 'config_user.py').write_text('\n'.join(_USER_CONFIG_LINES), encoding='utf-8')
+    importlib.invalidate_caches()
+    assert importlib.import_module(default_path).ConfigKLS1.config_a == 'user_a'
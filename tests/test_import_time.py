@@ -0,0 +1,48 @@
+"""
+import nb_config 启动耗时的回归测试，使用 python -X importtime 统计，超过预算就失败。
+nb_libs / multiprocessing 这些只在打印配置、判断主进程时才用到的依赖，以及环境变量、schema、文件配置源、合并报告、
+import hook、装饰器这些只在合并时才用到的子模块，不能在 import nb_config 时就被加载。
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# import nb_config 累计耗时预算，单位微秒，实测约 4000 us ；比较慢的 CI 机器可以用环境变量 NB_CONFIG_IMPORT_TIME_BUDGET_US 调整
+IMPORT_TIME_BUDGET_US = int(os.environ.get('NB_CONFIG_IMPORT_TIME_BUDGET_US', 10000))
+LAZY_MODULES = ('nb_libs', 'multiprocessing', 'contextvars', 'nb_config.env_overlay', 'nb_config.config_schema',
+                'nb_config.file_config_source', 'nb_config.merge_report', 'nb_config.import_hook',
+                'nb_config.nb_config_decorator')
+
+_project_root = str(Path(__file__).resolve().parents[1])
+
+
+def _run_import_nb_config():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (_project_root, env.get('PYTHONPATH')) if p)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)  # 允许写 pyc ，预算按有 pyc 的正常启动计算
+    # 解释器启动时(site 等)已经加载的模块不算 nb_config 加载的
+    code = ('import sys; loaded = set(sys.modules); import nb_config; '
+            f'print(",".join(m for m in {LAZY_MODULES!r} if m in sys.modules and m not in loaded))')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        # 格式为  import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].rstrip() == ' nb_config':  # 顶层的 nb_config 没有缩进
+            cumulative_us = int(parts[1])
+    return cumulative_us, proc.stdout.strip()
+
+
+def test_import_nb_config_within_budget():
+    _run_import_nb_config()  # 第一次运行生成 pyc
+    # 取多次中的最小值，排除机器抖动的影响
+    costs = [_run_import_nb_config()[0] for _ in range(5)]
+    assert None not in costs
+    assert min(costs) < IMPORT_TIME_BUDGET_US, f'import nb_config 耗时 {min(costs)} us 超过预算 {IMPORT_TIME_BUDGET_US} us'
+
+
+def test_import_nb_config_does_not_load_lazy_dependencies():
+    _, loaded_lazy_modules = _run_import_nb_config()
+    assert loaded_lazy_modules == '', f'import nb_config 时不应该加载 {loaded_lazy_modules}'
@@ -0,0 +1,249 @@
+"""
+UserConfigAutoImporter 合并流程的测试: 默认配置模块中的配置类(包括再导出的)都会被用户配置覆盖，
+环境变量覆盖层按 schema 转换类型并深度合并嵌套配置，嵌套配置的叶子也按嵌套配置类的 schema 校验，
+subscribe/watch 热加载，batch_auto_import_user_config 全部成功才合并。
+"""
+import gc
+import importlib
+import sys
+import time
+import types
+import weakref
+
+import pytest
+
+from nb_config import DataClassBase, UserConfigAutoImporter, batch_auto_import_user_config, nb_config_class
+from nb_config.env_overlay import parse_env_value
+from nb_config.import_user_config import iter_module_config_classes
+
+def _make_config_package(make_config_package, user_config_lines):
+    pkg_dir = make_config_package({
+        'redis_config': [
+            'from nb_config import DataClassBase',
+            'class RedisConfig(DataClassBase):',
+            '    host = "localhost"',
+            '    port = 6379',
+        ],
+        'config_default': [
+            'from nb_config import DataClassBase',
+            'from .redis_config import RedisConfig',
+            'class ConfigKLS1(DataClassBase):',
+            '    config_a = "default_a"',
+            '    timeout = 10',
+            '    is_debug = False',
+            '    redis = RedisConfig()',
+        ],
+        'config_user': user_config_lines,
+    })
+    return f'{pkg_dir.name}.config_user', f'{pkg_dir.name}.config_default'
+
+
+def test_iter_module_config_classes_includes_reexported_classes():
+    class LocalConfig(DataClassBase):
+        x = 1
+
+    m = types.ModuleType('nb_config_fake_default_module')
+    m.DataClassBase, m.LocalConfig, m.Alias, m.other = DataClassBase, LocalConfig, LocalConfig, object
+    assert list(iter_module_config_classes(m)) == [('LocalConfig', LocalConfig), ('Alias', LocalConfig)]
+
+
+def test_config_classes_are_not_kept_alive():
+    def _make_cls():
+        return type('TemporaryConfig', (DataClassBase,), {'x': 1})
+
+    config_cls_ref = weakref.ref(_make_cls())
+    gc.collect()
+    assert config_cls_ref() is None
+
+
+def test_reexported_config_class_is_merged(make_config_package):
+    user_path, default_path = _make_config_package(make_config_package, [
+        'from nb_config import DataClassBase',
+        'class ConfigKLS1(DataClassBase):',
+        '    config_a = "user_a"',
+        'class RedisConfig(DataClassBase):',
+        '    host = "10.0.0.2"',
+    ])
+    UserConfigAutoImporter(user_path, default_path, is_show_final_config=False).auto_import_user_config()
+    default_m = importlib.import_module(default_path)
+    assert default_m.ConfigKLS1.config_a == 'user_a'
+    assert (default_m.RedisConfig.host, default_m.RedisConfig.port) == ('10.0.0.2', 6379)
+    assert default_m.RedisConfig.has_merged_config is True
+
+
+_USER_CONFIG_LINES = [
+    'from nb_config import DataClassBase',
+    'class ConfigKLS1(DataClassBase):',
+    '    redis = {"host": "10.0.0.2"}',
+    'class RedisConfig(DataClassBase):',
+    '    pass',
+]
+
+
+def test_env_values_are_coerced_and_deep_merged(monkeypatch, make_config_package):
+    user_path, default_path = _make_config_package(make_config_package, _USER_CONFIG_LINES)
+    monkeypatch.setenv('NBTESTENV__CONFIGKLS1__TIMEOUT', '0.5')
+    monkeypatch.setenv('NBTESTENV__CONFIGKLS1__IS_DEBUG', 'on')
+    monkeypatch.setenv('NBTESTENV__CONFIGKLS1__REDIS', '{"port": "6380"}')
+    UserConfigAutoImporter(user_path, default_path, is_show_final_config=False, env_prefix='NBTESTENV').auto_import_user_config()
+    config_cls = importlib.import_module(default_path).ConfigKLS1
+    assert (config_cls.timeout, config_cls.is_debug) == (0.5, True)
+    assert config_cls.redis.get_dict() == {'host': '10.0.0.2', 'port': 6380}
+
+
+def test_env_json_containers_are_decoded():
+    assert parse_env_value('E', '["a", "b"]', []) == ['a', 'b']
+    assert parse_env_value('E', '[1, 2]', (0,)) == (1, 2)
+    assert parse_env_value('E', '{"k": 1}', {}) == {'k': 1}
+    for raw, default in (('a,b', []), ('{"k": 1}', []), ('[1]', {})):
+        with pytest.raises(ValueError, match='环境变量 E='):
+            parse_env_value('E', raw, default)
+
+
+@pytest.mark.parametrize('env_name, raw, message', [
+    ('NBTESTENV__CONFIGKLS1__TIMEOUT', 'abc', '环境变量 NBTESTENV__CONFIGKLS1__TIMEOUT ConfigKLS1.timeout'),
+    ('NBTESTENV__CONFIGKLS1__REDIS', 'prod-redis', '需要是 json 对象'),
+])
+def test_bad_env_values_raise(monkeypatch, make_config_package, env_name, raw, message):
+    user_path, default_path = _make_config_package(make_config_package, _USER_CONFIG_LINES)
+    monkeypatch.setenv(env_name, raw)
+    with pytest.raises(ValueError, match=message):
+        UserConfigAutoImporter(user_path, default_path, is_show_final_config=False,
+                               env_prefix='NBTESTENV').auto_import_user_config()
+    assert importlib.import_module(default_path).ConfigKLS1.timeout == 10
+
+
+def test_nested_config_leaves_are_validated(tmp_path, make_config_package):
+    user_path, default_path = _make_config_package(make_config_package, [
+        'from nb_config import DataClassBase',
+        'class ConfigKLS1(DataClassBase):',
+        '    config_a = "user_a"',
+        '    redis = {"port": "abc", "host": 1}',
+        'class RedisConfig(DataClassBase):',
+        '    port = "6380"',
+    ])
+    with pytest.raises(ValueError) as exc_info:
+        UserConfigAutoImporter(user_path, default_path, is_show_final_config=False).auto_import_user_config()
+    user_file = tmp_path / user_path.replace('.', '/')
+    assert f'"{user_file}.py:4" ConfigKLS1.redis.port = \'abc\' 的类型不对' in str(exc_info.value)
+    assert 'ConfigKLS1.redis.host' not in str(exc_info.value)  # int 可以转换成 str
+
+    (tmp_path / f'{user_path.replace(".", "/")}.py').write_text('\n'.join([
+        'from nb_config import DataClassBase',
+        'class ConfigKLS1(DataClassBase):',
+        '    redis = {"port": "6381"}',
+        'class RedisConfig(DataClassBase):',
+        '    port = "6380"',
+    ]), encoding='utf-8')
+    UserConfigAutoImporter(user_path, default_path, is_show_final_config=False).auto_import_user_config()
+    default_m = importlib.import_module(default_path)
+    assert default_m.ConfigKLS1.redis.get_dict() == {'host': 'localhost', 'port': 6381}
+    assert default_m.RedisConfig.port == 6380
+
+
+def _wait_for_diffs(diffs: list, count: int):
+    deadline = time.monotonic() + 5
+    while len(diffs) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_subscribe_receives_changes_and_watch_reloads(tmp_path, monkeypatch, make_config_package):
+    monkeypatch.setattr(sys, 'dont_write_bytecode', False)  # 生成 pyc ，同一秒内大小不变的修改也要重新加载
+    user_path, default_path = _make_config_package(make_config_package, _USER_CONFIG_LINES)
+    user_file = tmp_path / f'{user_path.replace(".", "/")}.py'
+    importer = UserConfigAutoImporter(user_path, default_path, is_show_final_config=False)
+    diffs = []
+    importer.subscribe(diffs.append)
+    importer.auto_import_user_config()
+    config_cls = importlib.import_module(default_path).ConfigKLS1
+    assert diffs == [{config_cls: {'redis': (config_cls._get_default_fields()['redis'], config_cls.redis)}}]
+
+    importer.auto_import_user_config()  # 文件没变，不重新合并，也没有变化
+    assert len(diffs) == 1
+
+    importer.watch(interval=0.01)
+    try:
+        user_lines = _USER_CONFIG_LINES + ['class ConfigKLS1(DataClassBase):', '    timeout = 30']
+        user_file.write_text('\n'.join(user_lines), encoding='utf-8')
+        _wait_for_diffs(diffs, 2)
+        time.sleep(0.01)
+        user_file.write_text('\n'.join(user_lines).replace('30', '40'), encoding='utf-8')
+        _wait_for_diffs(diffs, 3)
+    finally:
+        importer.stop_watch()
+    assert diffs[1][config_cls]['timeout'] == (10, 30)
+    assert 'redis' in diffs[1][config_cls]  # 用户删掉的配置项恢复成默认值
+    assert diffs[2] == {config_cls: {'timeout': (30, 40)}}
+    assert (config_cls.timeout, config_cls.redis.host) == (40, 'localhost')
+
+
+def test_batch_import_merges_all_or_nothing(tmp_path, make_config_package):
+    first = _make_config_package(make_config_package, _USER_CONFIG_LINES)
+    second = _make_config_package(make_config_package, ['from nb_config import DataClassBase',
+                                             'class ConfigKLS1(DataClassBase):',
+                                             '    timeout = "abc"',
+                                             'class RedisConfig(DataClassBase):',
+                                             '    pass'])
+    with pytest.raises(ValueError):
+        batch_auto_import_user_config([first, second])
+    assert importlib.import_module(first[1]).ConfigKLS1.has_merged_config is False  # 第二组出错，第一组也没有合并
+
+    second_user_file = tmp_path / f'{second[0].replace(".", "/")}.py'
+    second_user_file.write_text(second_user_file.read_text(encoding='utf-8').replace('"abc"', '"20"'), encoding='utf-8')
+    diffs = batch_auto_import_user_config([first, second, first])
+    assert list(diffs) == [first, second]
+    assert importlib.import_module(first[1]).ConfigKLS1.redis.host == '10.0.0.2'
+    assert importlib.import_module(second[1]).ConfigKLS1.timeout == 20
+
+
+def test_importers_sharing_a_default_module_layer_their_overrides(tmp_path, make_config_package):
+    first_user_path, default_path = _make_config_package(make_config_package, [
+        'from nb_config import DataClassBase',
+        'class ConfigKLS1(DataClassBase):',
+        '    config_a = "user_a"',
+        '    redis = {"host": "10.0.0.2"}',
+        'class RedisConfig(DataClassBase):',
+        '    pass',
+    ])
+    pkg_name = default_path.split('.')[0]
+    (tmp_path / pkg_name / 'config_user2.py').write_text('\n'.join([
+        'from nb_config import DataClassBase',
+        'class ConfigKLS1(DataClassBase):',
+        '    timeout = 20',
+        '    redis = {"port": 6380}',
+        'class RedisConfig(DataClassBase):',
+        '    pass',
+    ]), encoding='utf-8')
+    second_user_path = f'{pkg_name}.config_user2'
+
+    @nb_config_class(default_path)
+    class ConfigKLS1(DataClassBase):
+        is_debug = True
+
+    first = UserConfigAutoImporter(first_user_path, default_path, is_show_final_config=False, is_reload_user_config=True)
+    first.auto_import_user_config()
+    UserConfigAutoImporter(second_user_path, default_path, is_show_final_config=False).auto_import_user_config()
+    config_cls = importlib.import_module(default_path).ConfigKLS1
+    assert (config_cls.config_a, config_cls.timeout, config_cls.is_debug) == ('user_a', 20, True)
+    assert config_cls.redis.get_dict() == {'host': '10.0.0.2', 'port': 6380}
+
+    # 重新加载同一个用户配置时，它删掉的配置项恢复成默认值，别的导入器设置的配置项不变
+    (tmp_path / pkg_name / 'config_user.py').write_text('\n'.join(_USER_CONFIG_LINES), encoding='utf-8')
+    first.auto_import_user_config()
+    assert (config_cls.config_a, config_cls.timeout, config_cls.is_debug) == ('default_a', 20, True)
+
+
+def test_batch_pairs_sharing_a_default_module_do_not_cancel_each_other(tmp_path, make_config_package):
+    first_user_path, default_path = _make_config_package(make_config_package, _USER_CONFIG_LINES)
+    pkg_name = default_path.split('.')[0]
+    (tmp_path / pkg_name / 'config_user2.py').write_text('\n'.join([
+        'from nb_config import DataClassBase',
+        'class ConfigKLS1(DataClassBase):',
+        '    timeout = 20',
+        'class RedisConfig(DataClassBase):',
+        '    port = 6380',
+    ]), encoding='utf-8')
+    batch_auto_import_user_config([(first_user_path, default_path), (f'{pkg_name}.config_user2', default_path)])
+    default_m = importlib.import_module(default_path)
+    assert (default_m.ConfigKLS1.timeout, default_m.ConfigKLS1.redis.host) == (20, '10.0.0.2')
+    assert default_m.RedisConfig.port == 6380
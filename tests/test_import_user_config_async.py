@@ -0,0 +1,86 @@
+"""
+UserConfigAutoImporter.auto_import_user_config_async 的测试:
+100 个导入器并发加载用户配置并打印完整的最终配置时，事件循环的延迟保持平稳，最终配置在线程池中生成和打印；
+同一个用户配置模块的并发调用只执行一次模块代码。
+"""
+import asyncio
+import importlib
+import threading
+import time
+
+from nb_config import UserConfigAutoImporter
+
+
+def _make_config_package(make_config_package, class_count: int = 20, field_count: int = 20,
+                         user_module_sleep: float = 0.0):
+    default_lines = ['from nb_config import DataClassBase']
+    user_lines = ['import time', 'from nb_config import DataClassBase', 'from . import EXEC_COUNT',
+                  'EXEC_COUNT.append(1)', f'time.sleep({user_module_sleep})']  # 模拟读取秘钥文件等阻塞io
+    for c in range(class_count):
+        default_lines.append(f'class ConfigKls{c}(DataClassBase):')
+        user_lines.append(f'class ConfigKls{c}(DataClassBase):')
+        for f in range(field_count):
+            default_lines.append(f'    field_{f} = "default_{f}"')
+            user_lines.append(f'    field_{f} = "user_{f}"')
+    return make_config_package({'config_default': default_lines, 'config_user': user_lines}, 'EXEC_COUNT = []\n').name
+
+
+async def _heartbeat(stop_event: asyncio.Event, interval: float, lags: list):
+    while not stop_event.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - t0 - interval)
+
+
+def test_event_loop_latency_stays_flat_while_100_importers_load(make_config_package, monkeypatch, capsys):
+    pkg_names = [_make_config_package(make_config_package, user_module_sleep=0.01) for _ in range(100)]
+    print_thread_ids = set()
+    print_final_config = UserConfigAutoImporter._print_final_config
+
+    def _recording_print_final_config(self, *args):
+        print_thread_ids.add(threading.get_ident())
+        return print_final_config(self, *args)
+
+    monkeypatch.setattr(UserConfigAutoImporter, '_print_final_config', _recording_print_final_config)
+
+    async def _main():
+        stop_event = asyncio.Event()
+        lags = []
+        heartbeat_task = asyncio.ensure_future(_heartbeat(stop_event, 0.005, lags))
+        importers = [UserConfigAutoImporter(user_config_module_path=f'{pkg_name}.config_user',
+                                            default_config_module_path=f'{pkg_name}.config_default',
+                                            is_auto_create_user_config_file=False) for pkg_name in pkg_names]
+        t0 = time.perf_counter()
+        await asyncio.gather(*(importer.auto_import_user_config_async() for importer in importers))
+        total_cost = time.perf_counter() - t0
+        stop_event.set()
+        await heartbeat_task
+        return lags, total_cost, threading.get_ident()
+
+    lags, total_cost, loop_thread_id = asyncio.run(_main())
+    assert len(print_thread_ids) > 0 and loop_thread_id not in print_thread_ids  # 最终配置不在事件循环线程中生成和打印
+    assert capsys.readouterr().out.count('的最终融合配置') == 100 * 20
+    # 100 个用户配置模块每个阻塞 10ms ，同步加载会让事件循环卡住 1 秒以上；异步加载时每次心跳的延迟远小于总耗时
+    assert total_cost > 0.5
+    assert max(lags) < 0.2, f'事件循环最大延迟 {max(lags):.3f} s'
+
+    for pkg_name in pkg_names:
+        default_m = importlib.import_module(f'{pkg_name}.config_default')
+        assert default_m.ConfigKls0.field_0 == 'user_0'
+        assert default_m.ConfigKls19.has_merged_config is True
+
+
+def test_concurrent_calls_for_same_module_execute_user_module_once(make_config_package):
+    pkg_name = _make_config_package(make_config_package, class_count=2, field_count=2, user_module_sleep=0.05)
+
+    async def _main():
+        importers = [UserConfigAutoImporter(user_config_module_path=f'{pkg_name}.config_user',
+                                            default_config_module_path=f'{pkg_name}.config_default',
+                                            is_auto_create_user_config_file=False,
+                                            is_show_final_config=False) for _ in range(10)]
+        return await asyncio.gather(*(importer.auto_import_user_config_async() for importer in importers))
+
+    diffs = asyncio.run(_main())
+    pkg = importlib.import_module(pkg_name)
+    assert len(pkg.EXEC_COUNT) == 1
+    assert sum(1 for diff in diffs if diff) == 1  # 只有第一次合并改变了配置
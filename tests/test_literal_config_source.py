@@ -0,0 +1,127 @@
+"""
+python 用户配置模块字面量快速路径的测试: 纯字面量的配置模块不执行就能合并，有非字面量写法时退回 import 或者报错，
+解析结果按 mtime 缓存在进程内、按内容 sha1 缓存到磁盘。
+"""
+import importlib
+import sys
+
+import pytest
+
+from nb_config import UserConfigAutoImporter
+from nb_config import literal_config_source
+from nb_config.literal_config_source import NotLiteralConfigError, parse_literal_sections
+
+_LITERAL_USER_CONFIG = '''"""用户配置"""
+from nb_config import DataClassBase
+
+class ConfigKLS1(DataClassBase):
+    """说明"""
+    config_a = 'user_a'
+    config_b: int = -2
+    config_c = {'k': [1, 2, (3, None)]}
+'''
+
+
+def _make_config_package(make_config_package, user_config_source):
+    pkg_dir = make_config_package({
+        'config_default': [
+            'from nb_config import DataClassBase',
+            'class ConfigKLS1(DataClassBase):',
+            '    config_a = "default_a"',
+            '    config_b = 1',
+            '    config_c = {}',
+        ],
+        'config_user': user_config_source,
+    })
+    return pkg_dir, f'{pkg_dir.name}.config_user', f'{pkg_dir.name}.config_default'
+
+
+def test_parse_literal_sections():
+    assert parse_literal_sections(_LITERAL_USER_CONFIG) == {
+        'ConfigKLS1': {'config_a': 'user_a', 'config_b': -2, 'config_c': {'k': [1, 2, (3, None)]}}}
+
+
+@pytest.mark.parametrize('source', [
+    'from nb_config import DataClassBase\nclass ConfigKLS1(DataClassBase):\n    config_a = "a" + "b"',
+    'import os\nfrom nb_config import DataClassBase\nclass ConfigKLS1(DataClassBase):\n    config_a = "a"',
+    'from nb_config import DataClassBase, nb_config_class\n@nb_config_class("x")\nclass ConfigKLS1(DataClassBase):\n    config_a = "a"',
+    'from nb_config import DataClassBase\nclass ConfigKLS1(DataClassBase):\n    def config_a(self):\n        pass',
+    'from nb_config import DataClassBase\nclass Base(DataClassBase):\n    pass\nclass ConfigKLS1(Base):\n    config_a = "a"',
+    'from nb_config import DataClassBase\nprint(1)\nclass ConfigKLS1(DataClassBase):\n    config_a = "a"',
+    'class ConfigKLS1(DataClassBase):\n    config_a = ',
+])
+def test_non_literal_sources_are_rejected(source):
+    assert parse_literal_sections(source) is None
+
+
+def test_literal_mode_merges_without_executing_user_module(make_config_package):
+    _, user_path, default_path = _make_config_package(make_config_package, _LITERAL_USER_CONFIG)
+    importer = UserConfigAutoImporter(user_path, default_path, is_auto_create_user_config_file=False,
+                                      is_show_final_config=False, user_config_load_mode='literal')
+    importer.auto_import_user_config()
+    assert user_path not in sys.modules
+    config_cls = importlib.import_module(default_path).ConfigKLS1
+    assert (config_cls.config_a, config_cls.config_b, config_cls.config_c) == ('user_a', -2, {'k': [1, 2, (3, None)]})
+    assert importer.get_user_config_file().endswith('config_user.py')
+
+
+def test_non_literal_module_falls_back_to_import_or_raises(make_config_package):
+    _, user_path, default_path = _make_config_package(make_config_package, _LITERAL_USER_CONFIG + "    config_a = 'user_' + 'a2'\n")
+    with pytest.raises(NotLiteralConfigError):
+        UserConfigAutoImporter(user_path, default_path, is_auto_create_user_config_file=False, is_show_final_config=False,
+                               user_config_load_mode='literal_only').auto_import_user_config()
+    assert user_path not in sys.modules
+    assert importlib.import_module(default_path).ConfigKLS1.config_a == 'default_a'
+
+    UserConfigAutoImporter(user_path, default_path, is_auto_create_user_config_file=False, is_show_final_config=False,
+                           user_config_load_mode='literal').auto_import_user_config()
+    assert user_path in sys.modules
+    assert importlib.import_module(default_path).ConfigKLS1.config_a == 'user_a2'
+
+
+def test_missing_config_class_raises_like_import(make_config_package):
+    _, user_path, default_path = _make_config_package(make_config_package, 'from nb_config import DataClassBase\n')
+    with pytest.raises(AttributeError):
+        UserConfigAutoImporter(user_path, default_path, is_auto_create_user_config_file=False, is_show_final_config=False,
+                               user_config_load_mode='literal').auto_import_user_config()
+
+
+def test_parse_result_is_cached_by_mtime_and_content_hash(tmp_path, monkeypatch, make_config_package):
+    pkg_dir, user_path, _ = _make_config_package(make_config_package, _LITERAL_USER_CONFIG)
+    cache_dir = tmp_path / 'cache'
+    parse_calls = []
+
+    def _counting_parse(*args):
+        parse_calls.append(args)
+        return parse_literal_sections(*args)
+
+    monkeypatch.setattr(literal_config_source, '_DISK_CACHE_MIN_SIZE', 0)
+    monkeypatch.setattr(literal_config_source, 'parse_literal_sections', _counting_parse)
+    load = literal_config_source.load_literal_config_source
+    assert load(user_path, cache_dir).sections['ConfigKLS1']['config_b'] == -2
+    assert load(user_path, cache_dir).sections['ConfigKLS1']['config_b'] == -2  # 进程内按 mtime 命中
+    literal_config_source._literal_cache.clear()
+    assert load(user_path, cache_dir).sections['ConfigKLS1']['config_b'] == -2  # 磁盘上按 sha1 命中
+    assert len(parse_calls) == 1
+
+    (pkg_dir / 'config_user.py').write_text(_LITERAL_USER_CONFIG.replace('user_a', 'user_a3'), encoding='utf-8')
+    literal_config_source._literal_cache.clear()
+    assert load(user_path, cache_dir).sections['ConfigKLS1']['config_a'] == 'user_a3'
+    assert len(parse_calls) == 2
+
+
+def test_literal_mode_does_not_import_parent_packages(make_config_package):
+    pkg_dir, _, default_path = _make_config_package(make_config_package, _LITERAL_USER_CONFIG)
+    user_pkg_dir = pkg_dir / 'user_settings'
+    user_pkg_dir.mkdir()
+    (user_pkg_dir / '__init__.py').write_text('raise RuntimeError("用户包的 __init__.py 不应该被执行")', encoding='utf-8')
+    (user_pkg_dir / 'config_user.py').write_text(_LITERAL_USER_CONFIG, encoding='utf-8')
+    user_path = f'{pkg_dir.name}.user_settings.config_user'
+    UserConfigAutoImporter(user_path, default_path, is_auto_create_user_config_file=False, is_show_final_config=False,
+                           user_config_load_mode='literal_only').auto_import_user_config()
+    assert f'{pkg_dir.name}.user_settings' not in sys.modules
+    assert importlib.import_module(default_path).ConfigKLS1.config_a == 'user_a'
+    with pytest.raises(ModuleNotFoundError):
+        literal_config_source.find_user_config_module_file(f'{pkg_dir.name}.user_settings.no_such_module')
+    with pytest.raises(ModuleNotFoundError):
+        literal_config_source.find_user_config_module_file(f'{pkg_dir.name}.config_default.not_a_package')
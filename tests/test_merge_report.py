@@ -0,0 +1,60 @@
+"""
+合并耗时报告的测试: 开启后每次合并记录各阶段耗时和计数，并交给 hook 和 logging ；没开启时不产生报告。
+"""
+import logging
+
+from nb_config import UserConfigAutoImporter
+from nb_config.merge_report import MergeReport, PHASE_DESCS
+
+
+def _make_config_package(make_config_package):
+    pkg_dir = make_config_package({
+        'config_default': [
+            'from nb_config import DataClassBase',
+            'class ConfigKLS1(DataClassBase):',
+            '    config_a = "default_a"',
+            '    config_b = "default_b"',
+            'class ConfigKLS2(DataClassBase):',
+            '    config_c = 1',
+        ],
+        'config_user': [
+            'from nb_config import DataClassBase',
+            'class ConfigKLS1(DataClassBase):',
+            '    config_a = "user_a"',
+            '    config_b = "default_b"',
+            'class ConfigKLS2(DataClassBase):',
+            '    config_c = 2',
+        ],
+    })
+    return f'{pkg_dir.name}.config_user', f'{pkg_dir.name}.config_default'
+
+
+def test_report_records_phases_and_counters(make_config_package, caplog):
+    user_path, default_path = _make_config_package(make_config_package)
+    reports = []
+    importer = UserConfigAutoImporter(user_path, default_path, is_auto_create_user_config_file=False,
+                                      merge_report_hook=reports.append, merge_report_logger='nb_config.test_profile')
+    with caplog.at_level(logging.INFO, logger='nb_config.test_profile'):
+        importer.auto_import_user_config()
+
+    report = importer.last_merge_report
+    assert reports == [report]
+    assert isinstance(report, MergeReport)
+    assert list(report.phases) == ['import_user_config', 'import_default_config', 'build_merged_config',
+                                   'apply_merged_config', 'print_final_config']
+    assert set(report.phases) <= set(PHASE_DESCS)
+    assert report.class_count == 2
+    assert report.override_count == 2
+    assert report.changed_count == 2
+    assert report.printed_bytes > 0
+    assert report.total == sum(report.phases.values())
+    assert [r.nb_config_merge_report for r in caplog.records] == [report.as_dict()]
+
+
+def test_no_report_when_disabled(make_config_package):
+    user_path, default_path = _make_config_package(make_config_package)
+    importer = UserConfigAutoImporter(user_path, default_path, is_auto_create_user_config_file=False,
+                                      is_show_final_config=False)
+    assert importer._prepare_merge()[2] is None
+    importer.auto_import_user_config()
+    assert importer.last_merge_report is None
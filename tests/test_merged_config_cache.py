@@ -0,0 +1,85 @@
+"""
+跨进程合并配置缓存的测试: 主进程写缓存并把运行令牌放到环境变量，子进程按令牌读到同一次运行的缓存，
+令牌不同(另一次运行)或者没有令牌时不使用缓存。
+"""
+import os
+from pathlib import Path
+
+import pytest
+
+from nb_config import UserConfigAutoImporter
+from nb_config import import_user_config, merged_config_cache
+
+
+def _make_default_package(make_config_package):
+    pkg_dir = make_config_package({'config_default': [
+        'from nb_config import DataClassBase',
+        'class ConfigKLS1(DataClassBase):',
+        '    config_a = "default_a"',
+        '    timeout = 10',
+    ]})
+    return f'{pkg_dir.name}.config_default'
+
+
+@pytest.fixture
+def process_cache_importer(tmp_path, monkeypatch, make_config_package):
+    monkeypatch.delenv(merged_config_cache.PROCESS_CACHE_TOKEN_ENV, raising=False)
+    monkeypatch.setattr(merged_config_cache, '_process_cache_token', None)
+    user_file = tmp_path / 'config_user.toml'
+    user_file.write_text('[ConfigKLS1]\ntimeout = 5\n', encoding='utf-8')
+    cache_dir = tmp_path / 'cache'
+    return lambda: UserConfigAutoImporter(str(user_file), _make_default_package(make_config_package), is_show_final_config=False,
+                                          is_use_process_cache=True, process_cache_dir=str(cache_dir))
+
+
+def test_child_reads_cache_of_same_run_only(process_cache_importer, monkeypatch):
+    importer = process_cache_importer()
+    importer.auto_import_user_config()
+    token = merged_config_cache.get_process_cache_token(is_main=False)
+    assert token is not None and token.startswith(f'{os.getpid()}-')
+
+    monkeypatch.setattr(import_user_config, 'is_main_process', lambda: False)
+    prepared = importer._prepare_merge_from_process_cache()
+    assert prepared is not None and prepared[1][0][2] == {'timeout': 5}  # 只缓存用户配置写了的配置项
+
+    monkeypatch.setenv(merged_config_cache.PROCESS_CACHE_TOKEN_ENV, f'1-{"0" * 16}')  # 另一次运行的令牌
+    assert importer._prepare_merge_from_process_cache() is None
+    monkeypatch.delenv(merged_config_cache.PROCESS_CACHE_TOKEN_ENV)
+    assert importer._prepare_merge_from_process_cache() is None
+
+
+def test_new_run_removes_cache_files_of_finished_runs(process_cache_importer, monkeypatch):
+    importer = process_cache_importer()
+    importer.auto_import_user_config()
+    first_file, = Path(importer.process_cache_dir).glob('*.pickle')
+    stale_file = first_file.with_name(first_file.name.rsplit('__', 1)[0] + f'__999999999-{"0" * 16}.pickle')
+    stale_file.write_bytes(first_file.read_bytes())
+
+    monkeypatch.setattr(merged_config_cache, '_process_cache_token', None)  # 模拟新的一次运行
+    importer.auto_import_user_config()
+    assert not stale_file.exists()
+    assert len(list(first_file.parent.glob('*.pickle'))) == 2  # 两次运行的主进程都是当前进程，仍在运行，不删除
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason='只在 posix 上检查缓存目录的属主和权限')
+def test_cache_dir_accessible_by_others_or_symlinked_is_not_used(process_cache_importer, tmp_path, monkeypatch):
+    importer = process_cache_importer()
+    cache_dir = Path(importer.process_cache_dir)
+    cache_dir.mkdir(mode=0o755)
+    cache_dir.chmod(0o755)
+    importer.auto_import_user_config()
+    assert not list(cache_dir.iterdir())
+
+    cache_dir.chmod(0o700)
+    importer.auto_import_user_config()
+    cache_file, = cache_dir.iterdir()
+    monkeypatch.setattr(import_user_config, 'is_main_process', lambda: False)
+    assert importer._prepare_merge_from_process_cache() is not None
+    cache_dir.chmod(0o770)
+    assert importer._prepare_merge_from_process_cache() is None
+
+    linked_dir = tmp_path / 'linked_cache'
+    linked_dir.symlink_to(cache_dir, target_is_directory=True)
+    cache_dir.chmod(0o700)
+    assert not merged_config_cache.is_private_cache_dir(linked_dir)
+    assert merged_config_cache.load_merged_config_cache(linked_dir / cache_file.name, {}) is None
@@ -0,0 +1,121 @@
+"""
+@nb_config_class 装饰器的测试: 用户配置先于三方包导入时延迟覆盖、三方包已导入时立即覆盖、类型转换和嵌套深度合并、
+目标模块或配置类不存在时报错、目标是自己所在模块时告警。
+"""
+import importlib
+import sys
+
+import pytest
+
+from nb_config import DataClassBase, UserConfigAutoImporter, nb_config_class
+
+
+def _make_default_package(make_config_package, init_source=''):
+    pkg_dir = make_config_package({'config_default': [
+        'from nb_config import DataClassBase',
+        'class RedisConf(DataClassBase):',
+        '    host = "localhost"',
+        '    port = 6379',
+        'class DatabaseConfig(DataClassBase):',
+        '    host = "localhost"',
+        '    port = 5432',
+        '    redis = RedisConf()',
+    ]}, init_source)
+    return f'{pkg_dir.name}.config_default'
+
+
+def test_override_applied_when_target_imported_later(make_config_package):
+    default_path = _make_default_package(make_config_package)
+
+    @nb_config_class(default_path)
+    class DatabaseConfig(DataClassBase):
+        host = 'production-db.com'
+        port = '6543'
+        redis = {'host': 'prod-redis'}
+
+    default_m = importlib.import_module(default_path)
+    assert default_m.DatabaseConfig.host == 'production-db.com'
+    assert default_m.DatabaseConfig.port == 6543
+    assert default_m.DatabaseConfig.redis.get_dict() == {'host': 'prod-redis', 'port': 6379}
+    assert default_m.DatabaseConfig._get_default_fields()['host'] == 'localhost'
+    assert DatabaseConfig.host == 'production-db.com'
+
+
+def test_override_applied_immediately_when_target_already_imported(make_config_package):
+    default_m = importlib.import_module(_make_default_package(make_config_package))
+
+    @nb_config_class(default_m.__name__)
+    class DatabaseConfig(DataClassBase):
+        port = 1234
+
+    assert (default_m.DatabaseConfig.host, default_m.DatabaseConfig.port) == ('localhost', 1234)
+    assert default_m.DatabaseConfig().port == 1234
+
+
+@pytest.mark.parametrize('target', ['nb_config_decorator_no_such_module', 'nb_config_decorator_no_such_pkg.config',
+                                    'nb_config.no_such_config', 'nb_config.simple_data_class.not_a_package'])
+def test_missing_target_module_raises_import_error(target):
+    with pytest.raises(ImportError) as exc_info:
+        @nb_config_class(target)
+        class DatabaseConfig(DataClassBase):
+            port = 1234
+    assert not isinstance(exc_info.value, ModuleNotFoundError)
+
+
+def test_target_parent_package_is_not_imported(make_config_package):
+    default_path = _make_default_package(make_config_package, init_source='from . import config_default\n')
+
+    @nb_config_class(default_path)
+    class DatabaseConfig(DataClassBase):
+        port = 6543
+
+    assert default_path.split('.')[0] not in sys.modules  # 上级包导入配置模块，但是装饰器不导入上级包
+    assert importlib.import_module(default_path).DatabaseConfig.port == 6543
+
+
+def test_missing_target_class_raises_on_import(make_config_package):
+    default_path = _make_default_package(make_config_package)
+
+    @nb_config_class(default_path)
+    class NoSuchConfig(DataClassBase):
+        port = 1234
+
+    with pytest.raises(AttributeError):
+        importlib.import_module(default_path)
+
+
+def test_self_reference_warns_and_changes_nothing():
+    with pytest.warns(UserWarning):
+        @nb_config_class(__name__)
+        class SelfConfig(DataClassBase):
+            port = 1234
+
+    assert SelfConfig.port == 1234
+
+
+def test_wrong_target_in_user_config_module_does_not_recreate_it(tmp_path, make_config_package):
+    default_path = _make_default_package(make_config_package)
+    user_file = tmp_path / default_path.split('.')[0] / 'user_dec.py'
+    user_source = '\n'.join([
+        'from nb_config import DataClassBase, nb_config_class',
+        f'@nb_config_class({default_path + "_typo"!r})',
+        'class DatabaseConfig(DataClassBase):',
+        '    host = "production-db.com"',
+    ])
+    user_file.write_text(user_source, encoding='utf-8')
+    importer = UserConfigAutoImporter(f'{default_path.split(".")[0]}.user_dec', default_path, is_show_final_config=False)
+    with pytest.raises(ImportError):
+        importer.auto_import_user_config()
+    assert user_file.read_text(encoding='utf-8') == user_source
+
+
+def test_missing_import_inside_user_config_module_is_raised(tmp_path, make_config_package):
+    default_path = _make_default_package(make_config_package)
+    pkg_name = default_path.split('.')[0]
+    user_file = tmp_path / pkg_name / 'config_user.py'
+    user_source = 'import nb_config_no_such_dependency\nfrom nb_config import DataClassBase\n'
+    user_file.write_text(user_source, encoding='utf-8')
+    importer = UserConfigAutoImporter(f'{pkg_name}.config_user', default_path, is_show_final_config=False)
+    with pytest.raises(ModuleNotFoundError):
+        importer.auto_import_user_config()
+    assert user_file.read_text(encoding='utf-8') == user_source
@@ -0,0 +1,48 @@
+"""
+严格模式(__strict_merge__ = True)的测试: 合并之前读取类属性、实例属性、freeze()、override() 报 ConfigNotMergedError ，
+hasattr/getattr 默认值/inspect.getmembers 把它当成属性不存在；合并之后读取没有额外开销，合并之前创建的实例读到合并后的值。
+"""
+import inspect
+
+import pytest
+
+from nb_config import ConfigNotMergedError, DataClassBase
+
+
+def _make_strict_cls():
+    class StrictConfig(DataClassBase):
+        __strict_merge__ = True
+        host = 'localhost'
+        port = 6379
+
+    return StrictConfig
+
+
+def test_reads_before_merge_raise():
+    strict_cls = _make_strict_cls()
+    instance = strict_cls(host='passed')
+    for read in (lambda: strict_cls.port, lambda: instance.port, strict_cls.freeze, lambda: strict_cls.override(port=1)):
+        with pytest.raises(ConfigNotMergedError):
+            read()
+    assert instance.host == 'passed'  # 实例化时传入的字段可以读取
+    assert issubclass(ConfigNotMergedError, ValueError) and issubclass(ConfigNotMergedError, AttributeError)
+
+
+def test_attribute_probing_treats_unmerged_fields_as_missing():
+    strict_cls = _make_strict_cls()
+    assert not hasattr(strict_cls, 'port')
+    assert getattr(strict_cls(), 'port', None) is None
+    assert 'port' in dict(inspect.getmembers(strict_cls))  # 不抛出异常，拿到的是类 __dict__ 里的原始对象
+
+
+def test_merge_removes_guards_and_rebases_earlier_instances():
+    strict_cls = _make_strict_cls()
+    early, early_with_kwargs = strict_cls(), strict_cls(host='passed')
+    strict_cls.update_cls_attribute(port=6380)
+    strict_cls.has_merged_config = True
+    assert type(strict_cls.__dict__['host']) is str  # 换回了普通类属性
+    assert (strict_cls.port, strict_cls.freeze().port, strict_cls().port) == (6380, 6380, 6380)
+    assert early.get_dict() == {'host': 'localhost', 'port': 6380}
+    assert early_with_kwargs.get_dict() == {'host': 'passed', 'port': 6380}
+    strict_cls.update_cls_attribute(port=1)
+    assert early.port == 6380  # 之后和普通实例一样，保持实例化(合并完成)时的配置